@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import zlib
+
+SUFFIX = '.json.z'
+
+
+class CNFCache:
+    """Keeps the results of Grammar.to_cnf() in a directory, so converting a grammar again is only a load.
+
+    Entries are named by the sha256 of the grammar and the to_cnf() options that change the result (profile and
+    callback only report on the conversion, so they aren't taken), and hold the converted grammar as
+    zlib compressed JSON. Reading an entry touches it, and when the directory grows over max_size bytes the entries
+    that weren't used for the longest time are deleted.
+    """
+
+    def __init__(self, directory, max_size=64 << 20):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(grammar, share_suffixes=False, reduce_before=False, reduce_after=False):
+        """Nonterminals are sorted, productions keep their order since it decides the order of the result"""
+        options = {'share_suffixes': bool(share_suffixes), 'reduce_before': bool(reduce_before),
+                   'reduce_after': bool(reduce_after)}
+        canonical = json.dumps({'start_symbol': grammar.start_symbol, 'productions': grammar.productions,
+                                'options': options}, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def to_cnf(self, grammar, share_suffixes=False, reduce_before=False, reduce_after=False):
+        """grammar.to_cnf() with these options, converts the grammar in place from the cache when it was converted
+        before"""
+        options = {'share_suffixes': share_suffixes, 'reduce_before': reduce_before, 'reduce_after': reduce_after}
+        path = self.__path__(self.key(grammar, **options))
+        entry = self.__load__(path)
+        if entry is not None:
+            self.hits += 1
+            grammar.start_symbol = entry['start_symbol']
+            grammar.productions = entry['productions']
+            return grammar
+
+        self.misses += 1
+        grammar.to_cnf(**options)
+        data = zlib.compress(json.dumps({'start_symbol': grammar.start_symbol, 'productions': grammar.productions},
+                                        ensure_ascii=False, separators=(',', ':')).encode())
+        temporary = path + '.tmp'
+        with open(temporary, 'wb') as file:
+            file.write(data)
+        os.replace(temporary, path)  # readers never see a half written entry
+        self.__evict__(path)
+        return grammar
+
+    def invalidate(self, grammar=None, **options):
+        """Deletes the entry of a grammar converted with the given options, or every entry when no grammar is given.
+        Returns how many were deleted"""
+        if grammar is not None:
+            paths = [self.__path__(self.key(grammar, **options))]
+        else:
+            paths = [entry.path for entry in os.scandir(self.directory) if entry.name.endswith(SUFFIX)]
+        removed = 0
+        for path in paths:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def __path__(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def __load__(self, path):
+        try:
+            with open(path, 'rb') as file:
+                entry = json.loads(zlib.decompress(file.read()))
+        except FileNotFoundError:
+            return None
+        except (zlib.error, ValueError):
+            os.remove(path)  # a damaged entry is converted again
+            return None
+        os.utime(path)  # mark it as recently used
+        return entry
+
+    def __evict__(self, keep):
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(SUFFIX)]
+        stats = {entry.path: entry.stat() for entry in entries}
+        total = sum(stat.st_size for stat in stats.values())
+        for path in sorted(stats, key=lambda path: stats[path].st_mtime_ns):
+            if total <= self.max_size:
+                break
+            if path != keep:
+                os.remove(path)
+                total -= stats[path].st_size
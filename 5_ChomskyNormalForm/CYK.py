@@ -0,0 +1,80 @@
+class CYK:
+    """Membership checks for a grammar in Chomsky normal form (for example the result of Grammar.to_cnf()).
+
+    Every nonterminal with productions gets a bit, so a cell of the CYK table is a single integer mask of the
+    nonterminals that derive that substring. Binary productions are indexed by their (B, C) pair and grouped by B.
+    """
+
+    def __init__(self, grammar):
+        self.start_symbol = grammar.start_symbol
+        productions = grammar.productions
+        symbols = grammar.symbols
+        self.index = {nonterminal: bit for bit, nonterminal in enumerate(productions)}  # nonterminal -> bit number
+
+        self.accepts_empty = False
+        self.terminal_masks = {}  # terminal -> mask of the nonterminals A with A -> terminal
+        pair_masks = {}  # (B, C) -> mask of the nonterminals A with A -> B C
+        for nonterminal, rhs_list in productions.items():
+            bit = 1 << self.index[nonterminal]
+            for rhs in rhs_list:
+                is_terminal = [symbols.terminal[symbols.intern(symbol)] for symbol in rhs]
+                if rhs == ['ε'] and nonterminal == self.start_symbol:
+                    self.accepts_empty = True
+                elif len(rhs) == 1 and is_terminal[0] and rhs[0] != 'ε':
+                    self.terminal_masks[rhs[0]] = self.terminal_masks.get(rhs[0], 0) | bit
+                elif len(rhs) == 2 and not any(is_terminal):
+                    # a nonterminal without productions derives nothing, so neither does the rule
+                    if rhs[0] in self.index and rhs[1] in self.index:
+                        pair = (self.index[rhs[0]], self.index[rhs[1]])
+                        pair_masks[pair] = pair_masks.get(pair, 0) | bit
+                else:
+                    raise ValueError(f"{nonterminal} -> {' '.join(rhs)} is not in Chomsky normal form")
+
+        # for every B: the (bit of C, mask of A) pairs of the productions A -> B C
+        self.rules_by_left = [[] for _ in self.index]
+        for (left, right), mask in pair_masks.items():
+            self.rules_by_left[left].append((1 << right, mask))
+
+    def accepts(self, word):
+        """word is a string of one-character terminals or a list of terminals"""
+        n = len(word)
+        if n == 0:
+            return self.accepts_empty
+        if self.start_symbol not in self.index:
+            return False
+
+        # table[length - 1][start] is the mask of the nonterminals deriving word[start:start + length]
+        first_row = [self.terminal_masks.get(symbol, 0) for symbol in word]
+        if not all(first_row):
+            return False  # some symbol isn't produced by any rule
+        table = [first_row]
+        rules_by_left = self.rules_by_left
+        for length in range(2, n + 1):
+            row = []
+            for start in range(n - length + 1):
+                mask = 0
+                for left_length in range(1, length):
+                    left = table[left_length - 1][start]
+                    right = table[length - left_length - 1][start + left_length]
+                    if not left or not right:
+                        continue
+                    while left:
+                        lowest = left & -left
+                        left ^= lowest
+                        for right_bit, parents in rules_by_left[lowest.bit_length() - 1]:
+                            if right & right_bit:
+                                mask |= parents
+                row.append(mask)
+            table.append(row)
+        return bool(table[n - 1][0] >> self.index[self.start_symbol] & 1)
+
+    def accepts_all(self, words):
+        """Checks a batch of words, every distinct word is only checked once"""
+        results = {}
+        answers = []
+        for word in words:
+            key = word if isinstance(word, str) else tuple(word)
+            if key not in results:
+                results[key] = self.accepts(word)
+            answers.append(results[key])
+        return answers
@@ -0,0 +1,367 @@
+from SymbolTable import EPSILON
+
+
+class Earley:
+    """Earley recognizer and parser that works on any Grammar, no conversion to CNF needed.
+
+    Every input position gets a set of items (production, dot, origin), kept in a dict so each item is added once.
+    The dot skips a nullable nonterminal as soon as it reaches it (Aycock and Horspool), so ε productions need no
+    special completion step. The items predicted for a nonterminal are worked out once and cached.
+
+    Completions use Leo's optimization: when a single item at origin waits for the completed nonterminal and has it as
+    its last symbol, completing would only add a chain of complete items, one per level of right recursion. Only the
+    topmost item of that chain is added, and the chain of every (origin, nonterminal) is followed once and memoized.
+    Right recursive grammars run in linear time that way, like the other unambiguous ones. Recursion followed by a
+    nullable tail (S -> a S B with B nullable) doesn't make such a chain and stays quadratic.
+    """
+
+    def __init__(self, grammar):
+        rules = grammar.compile()
+        self.symbols = grammar.symbols
+        self.start = self.symbols.intern(grammar.start_symbol)
+        self.lhs = []  # production -> nonterminal
+        self.rhs = []  # production -> tuple of symbols, ε productions are empty
+        self.by_lhs = {}  # nonterminal -> its productions
+        for nonterminal, rhs_list in rules.items():
+            for rhs in rhs_list:
+                self.by_lhs.setdefault(nonterminal, []).append(len(self.lhs))
+                self.lhs.append(nonterminal)
+                self.rhs.append(tuple(symbol for symbol in rhs if symbol != EPSILON))
+        self.nullable = grammar.nullable_symbols()
+        self.predictions = {}  # nonterminal -> (productions predicted with it, nonterminals predicted with it)
+
+    def recognize(self, word):
+        """word is a string of one-character terminals or a list of terminals"""
+        return self.__run__(word, False) is not None
+
+    def parse(self, word):
+        """Returns the ParseForest of word, or None when the grammar doesn't generate it"""
+        result = self.__run__(word, True)
+        return ParseForest(self, *result, len(word)) if result is not None else None
+
+    def __predict__(self, nonterminal):
+        if nonterminal not in self.predictions:
+            terminal = self.symbols.terminal
+            predicted = [nonterminal]
+            seen = {nonterminal}
+            productions = []
+            for current in predicted:  # the list grows while it's read
+                for production in self.by_lhs.get(current, ()):
+                    productions.append(production)
+                    # everything the dot can reach without reading input gets predicted too
+                    for symbol in self.rhs[production]:
+                        if terminal[symbol]:
+                            break
+                        if symbol not in seen:
+                            seen.add(symbol)
+                            predicted.append(symbol)
+                        if symbol not in self.nullable:
+                            break
+            self.predictions[nonterminal] = (productions, predicted)
+        return self.predictions[nonterminal]
+
+    def __run__(self, word, forest):
+        """Builds the item sets, returns (sets, shortcuts, chains) or None when the word isn't accepted.
+
+        With forest, every item maps to the set of positions where its last symbol starts, otherwise to None.
+        shortcuts[position] lists the (origin, nonterminal) completions there that went through a Leo chain (only
+        with forest), and chains[origin, nonterminal] is the memoized chain, see __leo__.
+        """
+        ids = self.symbols.ids
+        terminal = self.symbols.terminal
+        lhs, rhs, nullable = self.lhs, self.rhs, self.nullable
+        tokens = [ids.get(token) for token in word]
+
+        sets = []
+        waiting_sets = []  # position -> {nonterminal: items with the dot before it}
+        chains = {}  # (position, nonterminal) -> Leo chain or None
+        shortcuts = {}
+        current = {}
+        agenda = []
+
+        def add(item, split):
+            if item not in current:
+                current[item] = ({split} if split is not None else set()) if forest else None
+                agenda.append(item)
+            elif forest:
+                current[item].add(split)
+
+        for production in self.__predict__(self.start)[0]:
+            add((production, 0, 0), None)
+        predicted = set(self.__predict__(self.start)[1])
+
+        for position in range(len(tokens) + 1):
+            waiting = {}
+            scans = {}  # terminal -> items with the dot before it
+            waiting_sets.append(waiting)
+            index = 0
+            while index < len(agenda):
+                item = agenda[index]
+                index += 1
+                production, dot, origin = item
+                body = rhs[production]
+                if dot == len(body):
+                    # complete: move the dot over lhs in the items that were waiting for it, or jump to the top of
+                    # their Leo chain. the sets before this one are finished, so their chains can't change anymore
+                    nonterminal = lhs[production]
+                    if origin < position:
+                        key = (origin, nonterminal)
+                        chain = chains.get(key, False)
+                        if chain is False:
+                            chain = self.__leo__(waiting_sets, chains, origin, nonterminal)
+                        if chain is not None:
+                            add(chain[0], chain[1])
+                            if forest:
+                                shortcuts.setdefault(position, []).append(key)
+                            continue
+                    for parent, parent_dot, parent_origin in waiting_sets[origin].get(nonterminal, ()):
+                        add((parent, parent_dot + 1, parent_origin), origin)
+                    continue
+                symbol = body[dot]
+                if terminal[symbol]:
+                    scans.setdefault(symbol, []).append(item)
+                    continue
+                waiting.setdefault(symbol, []).append(item)
+                if symbol not in predicted:
+                    productions, nonterminals = self.__predict__(symbol)
+                    predicted.update(nonterminals)
+                    for predicted_production in productions:
+                        add((predicted_production, 0, position), None)
+                if symbol in nullable:
+                    add((production, dot + 1, origin), position)
+            sets.append(current)
+
+            if position == len(tokens):
+                break
+            # scan
+            current = {}
+            agenda = []
+            predicted = set()
+            for production, dot, origin in scans.get(tokens[position], ()):
+                add((production, dot + 1, origin), position)
+            if not current:
+                return None
+
+        final = sets[-1]
+        if any((production, len(rhs[production]), 0) in final for production in self.by_lhs.get(self.start, ())):
+            return sets, shortcuts, chains
+        return None
+
+    def __leo__(self, waiting_sets, chains, origin, nonterminal):
+        """The Leo chain of nonterminal completed from origin: (topmost item, its split, item waiting at origin), or
+        None when the completion isn't deterministic there.
+
+        A chain goes up as long as the only item waiting for the nonterminal has it as its last symbol, and stops at
+        complete items of the start symbol from 0 so the final check still finds them. The levels are followed in a
+        loop and memoized on the way back, so every (origin, nonterminal) is only looked at once.
+        """
+        path = []
+        while True:
+            if (origin, nonterminal) in chains:
+                chain = chains[origin, nonterminal]
+                break
+            waiting = waiting_sets[origin].get(nonterminal, ())
+            chains[origin, nonterminal] = None  # also stops cycles of unit rules while the chain is followed
+            if len(waiting) != 1 or waiting[0][1] + 1 != len(self.rhs[waiting[0][0]]):
+                chain = None
+                break
+            path.append((origin, nonterminal, waiting[0]))
+            production, _, parent_origin = waiting[0]
+            if parent_origin == 0 and self.lhs[production] == self.start:
+                chain = None
+                break
+            origin, nonterminal = parent_origin, self.lhs[production]
+
+        for origin, nonterminal, step in reversed(path):
+            production, dot, parent_origin = step
+            if chain is None:
+                chain = ((production, dot + 1, parent_origin), origin, step)
+            else:
+                chain = (chain[0], chain[1], step)
+            chains[origin, nonterminal] = chain
+        return chain
+
+
+class ParseForest:
+    """All the parse trees of a word, with the parts they have in common stored once.
+
+    Nodes are tuples: (symbol, start, end) for a symbol deriving word[start:end], and (production, dot, start, end)
+    for the first dot symbols of a production deriving it. alternatives(node) lists the ways a node is built, as
+    tuples of child nodes: a symbol node from the full item node of one of its productions, an item node from the
+    item node one symbol shorter and the symbol node of that symbol.
+    """
+
+    def __init__(self, earley, sets, shortcuts, chains, length):
+        self.earley = earley
+        self.sets = sets
+        self.shortcuts = shortcuts
+        self.chains = chains
+        self.root = (earley.symbols.names[earley.start], 0, length)
+        self.completed = {}  # position -> {(nonterminal, origin): productions completed there}
+        self.cursors = {}  # position -> the Leo chains skipped there, at the first level not added back yet
+
+    def is_leaf(self, node):
+        return len(node) == 3 and self.earley.symbols.terminal[self.earley.symbols.ids[node[0]]]
+
+    def alternatives(self, node):
+        earley = self.earley
+        if len(node) == 3:
+            name, start, end = node
+            if self.is_leaf(node):
+                return []
+            self.__expand__(end, start)
+            productions = self.__completed__(end).get((earley.symbols.ids[name], start), ())
+            return [((production, len(earley.rhs[production]), start, end),) for production in productions]
+
+        production, dot, start, end = node
+        if dot == 0:
+            return [()]  # nothing of the production is read yet
+        name = earley.symbols.names[earley.rhs[production][dot - 1]]
+        alternatives = []
+        for split in sorted(self.sets[end][(production, dot, start)]):
+            right = (name, split, end)
+            alternatives.append((right,) if dot == 1 else ((production, dot - 1, start, split), right))
+        return alternatives
+
+    def production(self, node):
+        """The (lhs, rhs) names of the production of an item node"""
+        names = self.earley.symbols.names
+        return names[self.earley.lhs[node[0]]], [names[symbol] for symbol in self.earley.rhs[node[0]]]
+
+    def count(self):
+        """Number of parse trees, inf if a nonterminal derives itself somewhere in them"""
+        order, graph, cyclic = self.__graph__()
+        if cyclic:
+            return float('inf')
+        counts = {}
+        for node in order:
+            if self.is_leaf(node):
+                counts[node] = 1
+                continue
+            total = 0
+            for alternative in graph[node]:
+                product = 1
+                for child in alternative:
+                    product *= counts[child]
+                total += product
+            counts[node] = total
+        return counts[self.root]
+
+    def tree(self):
+        """One of the parse trees, as (nonterminal, [children]) with terminals as plain strings"""
+        best = self.__lowest__()
+
+        def children(node):
+            item = best[node][0]
+            symbols = []
+            while True:
+                alternative = best[item]
+                if not alternative:
+                    break
+                symbols.append(alternative[-1])
+                if len(alternative) == 1:
+                    break
+                item = alternative[0]
+            return symbols[::-1]
+
+        built = [[]]
+        stack = [(self.root, False)]
+        while stack:
+            node, done = stack.pop()
+            if self.is_leaf(node):
+                built[-1].append(node[0])
+            elif not done:
+                built.append([])
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(children(node)))
+            else:
+                subtrees = built.pop()
+                built[-1].append((node[0], subtrees))
+        return built[0][0]
+
+    def __completed__(self, position):
+        if position not in self.completed:
+            completed = {}
+            rhs, lhs = self.earley.rhs, self.earley.lhs
+            for production, dot, origin in self.sets[position]:
+                if dot == len(rhs[production]):
+                    completed.setdefault((lhs[production], origin), []).append(production)
+            self.completed[position] = completed
+        return self.completed[position]
+
+    def __expand__(self, position, start):
+        """Adds back the complete items from start or later that the recognizer skipped with Leo chains at position.
+
+        Going up a chain, the items start at the same or earlier positions, so a chain is only followed as far as
+        start and resumed from there by later calls. A chain that runs into an item added by another one stops there,
+        the other one goes on from that item.
+        """
+        cursors = self.cursors.setdefault(position, list(self.shortcuts.get(position, ())))
+        items = self.sets[position]
+        completed = self.__completed__(position)
+        lhs = self.earley.lhs
+        for index, cursor in enumerate(cursors):
+            while cursor is not None:
+                origin, nonterminal = cursor
+                topmost, _, (production, dot, parent_origin) = self.chains[cursor]
+                item = (production, dot + 1, parent_origin)
+                if parent_origin < start and item != topmost:
+                    break
+                splits = items.setdefault(item, set())
+                if item == topmost or origin in splits:
+                    cursor = None
+                    break
+                if not splits:
+                    completed.setdefault((lhs[production], parent_origin), []).append(production)
+                splits.add(origin)
+                cursor = (parent_origin, lhs[production])
+            cursors[index] = cursor
+        if None in cursors:
+            cursors[:] = [cursor for cursor in cursors if cursor is not None]
+
+    def __graph__(self):
+        """Nodes reachable from the root with children before parents, their alternatives and whether there's a
+        cycle among them. Iterative, parse trees can be much deeper than the recursion limit."""
+        graph = {self.root: self.alternatives(self.root)}
+        visiting = {self.root}
+        order = []
+        cyclic = False
+        stack = [(self.root, iter([child for alternative in graph[self.root] for child in alternative]))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if child not in graph:
+                    graph[child] = self.alternatives(child)
+                    visiting.add(child)
+                    stack.append((child, iter([grandchild for alternative in graph[child]
+                                               for grandchild in alternative])))
+                    break
+                if child in visiting:
+                    cyclic = True
+            else:
+                stack.pop()
+                visiting.discard(node)
+                order.append(node)
+        return order, graph, cyclic
+
+    def __lowest__(self):
+        """For every node the alternative of the lowest tree. Children come first in the order, so without cycles
+        the first pass already finds them all"""
+        order, graph, _ = self.__graph__()
+        height = {}
+        best = {}
+        changed = True
+        while changed:
+            changed = False
+            for node in order:
+                if self.is_leaf(node):
+                    height[node] = 0
+                    continue
+                for alternative in graph[node]:
+                    if all(child in height for child in alternative):
+                        candidate = 1 + max((height[child] for child in alternative), default=0)
+                        if candidate < height.get(node, float('inf')):
+                            height[node] = candidate
+                            best[node] = alternative
+                            changed = True
+        return best
@@ -0,0 +1,151 @@
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from Earley import Earley
+from Grammar import Grammar
+from SymbolTable import EPSILON
+
+
+class Sampler:
+    """Random strings of a grammar with up to max_length terminals, as tuples of terminal names.
+
+    uniform() first picks one of the lengths the grammar has strings of, then a derivation of that length with
+    equal chances for all of them, using the derivation counts of the CNF of the grammar. For an unambiguous grammar
+    that's a uniform pick among the strings of that length. random_derivation() expands the leftmost nonterminal of
+    the original grammar with a random production until only terminals are left, which is cheaper to set up but
+    favours strings with short derivations.
+    """
+
+    def __init__(self, grammar, max_length):
+        self.grammar = grammar
+        self.max_length = max_length
+        self.cnf = None
+
+    def __prepare__(self):
+        if self.cnf is None:
+            self.cnf, self.counts = self.grammar.derivation_counts(self.max_length)
+            self.start = self.cnf.symbols.ids.get(self.cnf.start_symbol)
+            start_counts = self.counts.get(self.start, [])
+            self.lengths = [length for length, count in enumerate(start_counts) if count]
+
+    def uniform(self, rng):
+        """None when the grammar has no strings that short"""
+        self.__prepare__()
+        if not self.lengths:
+            return None
+        rules, counts = self.cnf.rules, self.counts
+        terminal, names = self.cnf.symbols.terminal, self.cnf.symbols.names
+        string = []
+        stack = [(self.start, rng.choice(self.lengths))]
+        while stack:
+            nonterminal, length = stack.pop()
+            pick = rng.randrange(counts[nonterminal][length])
+            for rhs in rules[nonterminal]:
+                if len(rhs) == 1:
+                    if rhs[0] == EPSILON and length == 0:
+                        pick -= 1
+                    elif rhs[0] != EPSILON and terminal[rhs[0]] and length == 1:
+                        pick -= 1
+                    if pick < 0:
+                        if rhs[0] != EPSILON:
+                            string.append(names[rhs[0]])
+                        break
+                    continue
+                left, right = rhs
+                for size in range(1, length):
+                    pick -= counts[left][size] * counts[right][length - size]
+                    if pick < 0:
+                        break
+                if pick < 0:
+                    stack.append((right, length - size))
+                    stack.append((left, size))  # expanded first, so the terminals come out left to right
+                    break
+        return tuple(string)
+
+    def random_derivation(self, rng, attempts=100):
+        """None when no derivation stayed short enough in the given number of attempts"""
+        rules = self.grammar.compile()
+        terminal, names = self.grammar.symbols.terminal, self.grammar.symbols.names
+        start = self.grammar.symbols.intern(self.grammar.start_symbol)
+        limit = 10 * (self.max_length + 1)  # pending symbols, nullable ones can still make it a short string
+        for _ in range(attempts):
+            string = []
+            stack = [start]
+            while stack and len(string) <= self.max_length and len(stack) <= limit:
+                symbol = stack.pop()
+                if symbol == EPSILON:
+                    continue
+                if terminal[symbol]:
+                    string.append(names[symbol])
+                elif symbol in rules:
+                    stack.extend(reversed(rng.choice(rules[symbol])))
+                else:
+                    break  # a nonterminal without productions, this derivation can't finish
+            else:
+                if not stack and len(string) <= self.max_length:
+                    return tuple(string)
+        return None
+
+
+def check_samples(sampled, other, samples, max_length, mode, seed):
+    """Draws samples strings from the grammar sampled and returns the ones the grammar other doesn't generate"""
+    sampler = Sampler(sampled, max_length)
+    earley = Earley(other)
+    rng = random.Random(seed)
+    draw = sampler.uniform if mode == 'uniform' else sampler.random_derivation
+    counterexamples = []
+    checked = {}
+    for _ in range(samples):
+        string = draw(rng)
+        if string is None:
+            break
+        if string not in checked:
+            checked[string] = earley.recognize(list(string))
+            if not checked[string]:
+                counterexamples.append(''.join(string))
+    return counterexamples
+
+
+def check_equivalence(first, second, samples=1000, max_length=20, mode='uniform', workers=None, seed=0):
+    """Looks for strings generated by only one of two grammars, like a grammar and its to_cnf() result.
+
+    samples strings are drawn from each grammar (mode is 'uniform' or 'derivation', see Sampler) and checked with an
+    Earley parser of the other one. The work is split across workers processes, all cores by default, workers=1
+    runs everything in this process. Finding nothing doesn't prove the grammars are equivalent, but a returned
+    counterexample is always real. Returns {'first_only': [...], 'second_only': [...], 'samples': 2 * samples}.
+    """
+    workers = workers or os.cpu_count() or 1
+    jobs = []
+    for direction, (sampled, other) in enumerate([(first, second), (second, first)]):
+        for part in range(workers):
+            share = samples // workers + (part < samples % workers)
+            if share:
+                jobs.append((direction, (sampled, other, share, max_length, mode, seed * 2 * workers + len(jobs))))
+
+    if workers == 1:
+        results = [check_samples(*arguments) for _, arguments in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(check_samples, *arguments) for _, arguments in jobs]
+            results = [future.result() for future in futures]
+
+    found = ([], [])
+    for (direction, _), counterexamples in zip(jobs, results):
+        found[direction].extend(string for string in counterexamples if string not in found[direction])
+    return {'first_only': found[0], 'second_only': found[1], 'samples': 2 * samples}
+
+
+if __name__ == "__main__":
+    grammar = Grammar("S", {
+        'S': [['A']],
+        'A': [['d'], ['d', 'S'], ['a', 'A', 'd', 'A', 'B']],
+        'B': [['a', 'C'], ['a', 'S'], ['A', 'C']],
+        'C': [['ε']],
+        'E': [['A', 'S']],
+    })
+    cnf = Grammar(grammar.start_symbol, {nonterminal: [list(rhs) for rhs in rhs_list]
+                                         for nonterminal, rhs_list in grammar.productions.items()})
+    cnf.to_cnf()
+    for mode in ('uniform', 'derivation'):
+        print(mode, check_equivalence(grammar, cnf, samples=2000, max_length=30, mode=mode))
@@ -1,166 +1,487 @@
+import copy
+import time
+import tracemalloc
+
+from SymbolTable import SymbolTable, EPSILON
+
+
 class Grammar:
+    """A context free grammar.
+
+    Productions are given and read as {nonterminal: [[symbol, ...], ...]}, but the transformations run over a
+    compiled form: every symbol is interned to an int in self.symbols and self.rules maps nonterminal ids to lists
+    of RHS tuples. The two forms are only converted into each other when the other one is needed.
+    """
+
     def __init__(self, start_symbol, productions=None):
         self.start_symbol = start_symbol
+        self.symbols = SymbolTable()
+        self.rules = None
         self.productions = productions if productions is not None else {}
 
+    @property
+    def productions(self):
+        if self._productions is None:
+            self._productions = self.symbols.decode(self.rules)
+            self.rules = None  # the returned dict may be changed in place, so it's the only valid form from now on
+        return self._productions
+
+    @productions.setter
+    def productions(self, productions):
+        self._productions = productions
+        self.rules = None
+
+    def compile(self):
+        """Switches to the compiled form, returns the rules"""
+        if self.rules is None:
+            self.rules = self.symbols.encode(self._productions)
+            self._productions = None
+        return self.rules
+
     def add_production(self, nonterminal, rhs):
         if nonterminal not in self.productions:
             self.productions[nonterminal] = []
         self.productions[nonterminal].append(rhs)
 
-    def to_cnf(self):
-        self.eliminate_start_symbol()
-        self.eliminate_epsilon_rules()
-        self.eliminate_nonsolitary_terminals()
-        self.eliminate_rhs_with_more_than_two_nonterminals()
-        self.eliminate_unit_rules()
+    def to_cnf(self, share_suffixes=False, reduce_before=False, reduce_after=False, profile=False, callback=None):
+        """Converts the grammar to Chomsky normal form.
+
+        With profile or a callback every stage is measured, the measurements are returned as a list with a dict per
+        stage and each one is passed to callback(stage) as soon as the stage ends. Stage times include the slowdown
+        of tracemalloc. Without them nothing is measured and None is returned.
+
+        When tracemalloc is already running, every stage resets its peak. traced_peak_bytes is the peak it would
+        have had otherwise: the highest of the peak before to_cnf() and the peaks of the stages so far.
+
+        The BIN entry also has saved_helpers, the helper nonterminals that share_suffixes saved, and REDUCE entries
+        have removed_productions, the productions remove_useless_symbols() removed.
+        """
+        # stage name, function and the key its result is reported under
+        stages = [('START', self.eliminate_start_symbol, None),
+                  ('DEL', self.eliminate_epsilon_rules, None),
+                  ('TERM', self.eliminate_nonsolitary_terminals, None),
+                  ('BIN', lambda: self.eliminate_rhs_with_more_than_two_nonterminals(share_suffixes), 'saved_helpers'),
+                  ('UNIT', self.eliminate_unit_rules, None)]
+        if reduce_before:
+            stages.insert(0, ('REDUCE', self.remove_useless_symbols, 'removed_productions'))
+        if reduce_after:
+            stages.append(('REDUCE', self.remove_useless_symbols, 'removed_productions'))
+
+        if not profile and callback is None:
+            for _, stage, _ in stages:
+                stage()
+            return None
+
+        report = []
+        tracing = tracemalloc.is_tracing()
+        traced_peak = tracemalloc.get_traced_memory()[1] if tracing else 0  # the caller's, reset_peak() wipes it
+        for name, stage, key in stages:
+            before = self.size()
+            if not tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            result = stage()
+            seconds = time.perf_counter() - start
+            stage_peak = tracemalloc.get_traced_memory()[1]
+            traced_peak = max(traced_peak, stage_peak)
+            if not tracing:
+                tracemalloc.stop()
+
+            entry = {'stage': name, 'seconds': seconds, 'peak_bytes': stage_peak - current,
+                     'traced_peak_bytes': traced_peak, 'before': before, 'after': self.size()}
+            if key is not None:
+                entry[key] = result
+            report.append(entry)
+            if callback is not None:
+                callback(entry)
+        return report
+
+    def size(self):
+        """Counts of nonterminals, productions and RHS symbols"""
+        rules = self.compile()
+        return {'nonterminals': len(rules),
+                'productions': sum(map(len, rules.values())),
+                'symbols': sum(len(rhs) for rhs_list in rules.values() for rhs in rhs_list)}
+
+    def remove_useless_symbols(self):
+        """Removes the productions of nonterminals that can't derive a string of terminals or can't be reached from the
+        start symbol, and the productions that use them. Returns the number of productions removed."""
+        rules = self.compile()
+        terminal = self.symbols.terminal
+        size = sum(map(len, rules.values()))
+
+        # a production generates once all the nonterminals in it do
+        generating = self.__least_fixpoint__(lambda rhs: sum(not terminal[symbol] for symbol in rhs))
+        kept_rules = {}
+        for nonterminal, rhs_list in rules.items():
+            if nonterminal in generating:
+                kept = [rhs for rhs in rhs_list if all(terminal[symbol] or symbol in generating for symbol in rhs)]
+                # keep the list itself when nothing was removed, eliminate_unit_rules shares them
+                kept_rules[nonterminal] = rhs_list if len(kept) == len(rhs_list) else kept
+        rules = kept_rules
+
+        reachable = set()
+        start = self.symbols.intern(self.start_symbol)
+        stack = [start] if start in rules else []
+        reachable.update(stack)
+        while stack:
+            for rhs in rules[stack.pop()]:
+                for symbol in rhs:
+                    if not terminal[symbol] and symbol not in reachable:
+                        reachable.add(symbol)
+                        stack.append(symbol)
+
+        self.rules = {nonterminal: rhs_list for nonterminal, rhs_list in rules.items() if nonterminal in reachable}
+        return size - sum(map(len, self.rules.values()))
 
     def eliminate_start_symbol(self):
+        rules = self.compile()
         new_start_symbol = self.start_symbol + "0"                  # ensure the new start symbol is unique
-        self.productions[new_start_symbol] = [[self.start_symbol]]  # add new start rule
+        rules[self.symbols.intern(new_start_symbol)] = [(self.symbols.intern(self.start_symbol),)]  # add new rule
         self.start_symbol = new_start_symbol                        # update the start symbol to the new one
 
-    def eliminate_rhs_with_more_than_two_nonterminals(self):
-        """Eliminates all productions with more than 2 symbols by creating new productions"""
+    def eliminate_rhs_with_more_than_two_nonterminals(self, share_suffixes=False):
+        """Eliminates all productions with more than 2 symbols by creating new productions.
+
+        With share_suffixes, productions that end the same way reuse the helper nonterminals of that ending.
+        Returns how many helper nonterminals were saved that way.
+        """
+        rules = self.compile()
         # temp dict to store new rules
-        new_productions = {nt: [] for nt, _ in self.productions.items()}
+        new_rules = {nonterminal: [] for nonterminal in rules}
 
         count = 0  # a counter to create unique names
+        helpers = {}  # (symbol, symbol after it or the helper for the rest) -> helper nonterminal
+        needed = 0
 
-        for nonterminal, rhs_list in self.productions.items():
+        for nonterminal, rhs_list in rules.items():
             for rhs in rhs_list:
-                if len(rhs) > 2:
+                if len(rhs) <= 2:
+                    # production is already binary
+                    new_rules[nonterminal].append(rhs)
+                elif share_suffixes:
+                    # build the chain from the end, so the helper of each suffix is known before the symbol in front
+                    needed += len(rhs) - 2
+                    pair = rhs[-2:]
+                    for index in range(len(rhs) - 3, -1, -1):
+                        helper = helpers.get(pair)
+                        if helper is None:
+                            helper = self.symbols.intern(f"{self.symbols.names[nonterminal]}_BIN{count}")
+                            count += 1
+                            helpers[pair] = helper
+                            new_rules[helper] = [pair]
+                        pair = (rhs[index], helper)
+                    new_rules[nonterminal].append(pair)
+                else:
                     current_nonterminal = nonterminal
-                    remaining_rhs = rhs[:]
 
-                    # create new rules until only two symbols are left in the remaining_rhs
-                    while len(remaining_rhs) > 2:
+                    # create new rules until only two symbols are left
+                    for symbol in rhs[:-2]:
                         # this isn't the best way to create a unique name, but it works
-                        new_nonterminal = f"{nonterminal}_BIN{count}"
+                        new_nonterminal = self.symbols.intern(f"{self.symbols.names[nonterminal]}_BIN{count}")
                         count += 1
 
                         # ensure the new nonterminal is initialized in the dict
-                        if new_nonterminal not in new_productions:
-                            new_productions[new_nonterminal] = []
+                        if new_nonterminal not in new_rules:
+                            new_rules[new_nonterminal] = []
 
                         # create a new rule
-                        new_productions[current_nonterminal].append([remaining_rhs.pop(0), new_nonterminal])
+                        new_rules[current_nonterminal].append((symbol, new_nonterminal))
                         current_nonterminal = new_nonterminal
 
                     # the final production
-                    new_productions[current_nonterminal].append(remaining_rhs)
-                else:
-                    # production is already binary
-                    new_productions[nonterminal].append(rhs)
+                    new_rules[current_nonterminal].append(rhs[-2:])
 
-        self.productions = new_productions
+        self.rules = new_rules
+        return needed - len(helpers)
 
     def eliminate_nonsolitary_terminals(self):
         """Eliminate terminals from RHS if they exist with other terminals or non-terminals"""
+        rules = self.compile()
+        terminal = self.symbols.terminal
         # dict to store new nonterminal mappings for terminals
         terminal_to_nonterminal = {}
 
         # temporary dictionary to accumulate new rules to be added after the loop
-        additional_productions = {}
-
-        # cloning productions
-        new_productions = {nt: [list(rhs) for rhs in rhs_list] for nt, rhs_list in self.productions.items()}
+        additional_rules = {}
 
-        for nonterminal, rhs_list in new_productions.items():
+        new_rules = {}
+        for nonterminal, rhs_list in rules.items():
+            new_rhs_list = []
             for rhs in rhs_list:
-                for i, symbol in enumerate(rhs):
-                    if symbol.islower() and len(rhs) > 1:  # it's a terminal and not solitary
-                        if symbol not in terminal_to_nonterminal:
-                            # create a new nonterminal for this terminal if not already created
-                            new_nonterminal = f'N_{symbol}'
-                            terminal_to_nonterminal[symbol] = new_nonterminal
-                            additional_productions[new_nonterminal] = [[symbol]]
-                        # replace the terminal with nonterminal in RHS
-                        rhs[i] = terminal_to_nonterminal[symbol]
-
-        # add new productions for new nonterminals to the main productions dict
-        for nonterminal, rules in additional_productions.items():
-            if nonterminal in new_productions:
-                new_productions[nonterminal].extend(rules)
+                if len(rhs) > 1 and any(terminal[symbol] for symbol in rhs):  # a terminal that isn't solitary
+                    new_rhs = []
+                    for symbol in rhs:
+                        if terminal[symbol]:
+                            if symbol not in terminal_to_nonterminal:
+                                # create a new nonterminal for this terminal if not already created
+                                new_nonterminal = self.symbols.intern(f'N_{self.symbols.names[symbol]}')
+                                terminal_to_nonterminal[symbol] = new_nonterminal
+                                additional_rules[new_nonterminal] = [(symbol,)]
+                            # replace the terminal with nonterminal in RHS
+                            symbol = terminal_to_nonterminal[symbol]
+                        new_rhs.append(symbol)
+                    rhs = tuple(new_rhs)
+                new_rhs_list.append(rhs)
+            new_rules[nonterminal] = new_rhs_list
+
+        # add new productions for new nonterminals to the main rules dict
+        for nonterminal, rhs_list in additional_rules.items():
+            if nonterminal in new_rules:
+                new_rules[nonterminal].extend(rhs_list)
             else:
-                new_productions[nonterminal] = rules
+                new_rules[nonterminal] = rhs_list
 
-        self.productions = new_productions
+        self.rules = new_rules
 
     def eliminate_epsilon_rules(self):
-        # identify nullable nonterminals (those that can generate epsilon directly)
-        nullable = set()
-        for nonterminal, rhs_list in self.productions.items():
-            for rhs in rhs_list:
-                if rhs == ['ε']:
-                    nullable.add(nonterminal)
-
-        # expand nullable set to include nonterminals that can produce epsilon through other nullable nonterminals
-        changes = True
-        while changes:
-            changes = False
-            for nonterminal, rhs_list in self.productions.items():
-                for rhs in rhs_list:
-                    if all(symbol in nullable for symbol in rhs) and nonterminal not in nullable:
-                        nullable.add(nonterminal)
-                        changes = True
+        rules = self.compile()
+        start = self.symbols.intern(self.start_symbol)
+        nullable = self.nullable_symbols()
 
-        # remove all epsilon productions
-        for nonterminal in list(self.productions.keys()):
-            self.productions[nonterminal] = [rhs for rhs in self.productions[nonterminal] if rhs != ['ε']]
+        # nonterminals that derive a non-empty string. The others only derive ε, so they're always omitted.
+        # a production needs a single such symbol, unless it already has one that isn't nullable
+        solid = self.__least_fixpoint__(
+            lambda rhs: 0 if any(symbol not in nullable and symbol != EPSILON for symbol in rhs) else 1)
 
-        # remove all instances of nullable nonterminals from other productions
-        for nonterminal in self.productions.keys():
+        new_rules = {}
+        for nonterminal, rhs_list in rules.items():
+            if nonterminal not in solid:
+                continue  # remove any nonterminals that do not produce anything
             new_rhs_list = []
-            for rhs in self.productions[nonterminal]:
-                # filter out any nullable nonterminals from rhs
-                filtered_rhs = [symbol for symbol in rhs if symbol not in nullable]
-                if filtered_rhs:  # only add non-empty productions
-                    new_rhs_list.append(filtered_rhs)
-                elif nonterminal == self.start_symbol:  # allow start symbol to produce epsilon if it becomes empty
-                    new_rhs_list.append(['ε'])
-            self.productions[nonterminal] = new_rhs_list
-
-        # remove any nonterminals that do not produce anything
-        self.productions = {nt: rhs_list for nt, rhs_list in self.productions.items() if rhs_list}
+            seen = set()
+            for rhs in rhs_list:
+                rhs = tuple(symbol for symbol in rhs
+                            if symbol in solid or (symbol not in nullable and symbol != EPSILON))
+                for variant in self.__omissions__(rhs, nullable):
+                    if variant not in seen:
+                        seen.add(variant)
+                        new_rhs_list.append(variant)
+            new_rules[nonterminal] = new_rhs_list
+
+        if start in nullable:  # allow start symbol to produce epsilon
+            new_rules.setdefault(start, []).append((EPSILON,))
+        self.rules = new_rules
+
+    def nullable_symbols(self):
+        """The set of nonterminal ids that derive ε"""
+        self.compile()
+        return self.__least_fixpoint__(lambda rhs: sum(symbol != EPSILON for symbol in rhs))
+
+    def __least_fixpoint__(self, count):
+        """Nonterminals with a production that gets complete, count(rhs) says how many symbol occurrences of the
+        production have to be in the result for that. Every production is visited once per symbol occurrence."""
+        productions = []  # (nonterminal, symbols still missing) for every production
+        occurrences = {}  # symbol -> indexes of the productions it occurs in, once per occurrence
+        result = set()
+        worklist = []
+        for nonterminal, rhs_list in self.rules.items():
+            for rhs in rhs_list:
+                missing = count(rhs)
+                if missing == 0:
+                    if nonterminal not in result:
+                        result.add(nonterminal)
+                        worklist.append(nonterminal)
+                    continue
+                for symbol in rhs:
+                    occurrences.setdefault(symbol, []).append(len(productions))
+                productions.append([nonterminal, missing])
+
+        while worklist:
+            symbol = worklist.pop()
+            for index in occurrences.pop(symbol, ()):
+                production = productions[index]
+                production[1] -= 1
+                if production[1] == 0 and production[0] not in result:
+                    result.add(production[0])
+                    worklist.append(production[0])
+        return result
+
+    @staticmethod
+    def __omissions__(rhs, nullable):
+        """Yields rhs with every combination of its nullable symbols left out, except the empty one.
+
+        Variants are produced one by one like a binary counter, so only the current choice is kept in memory.
+        """
+        positions = [index for index, symbol in enumerate(rhs) if symbol in nullable]
+        for mask in range(1 << len(positions)):
+            if mask:
+                omitted = {positions[bit] for bit in range(len(positions)) if mask >> bit & 1}
+                variant = tuple(symbol for index, symbol in enumerate(rhs) if index not in omitted)
+            else:
+                variant = rhs
+            if variant:
+                yield variant
 
     def eliminate_unit_rules(self):
-        # discover all unit rules
+        rules = self.compile()
+        terminal = self.symbols.terminal
+
+        # split every production list into unit rules and the rest
         unit_productions = {}
-        for nonterminal, productions in self.productions.items():
-            unit_productions[nonterminal] = [
-                rhs[0] for rhs in productions if len(rhs) == 1 and rhs[0].isupper()
-            ]
-
-        # resolve unit rules by finding all transitive targets
-        transitive_closure = {}
-        for nonterminal in self.productions:
-            transitive_closure[nonterminal] = set()
-            stack = [nonterminal]
-            while stack:
-                current = stack.pop()
-                for target in unit_productions.get(current, []):
-                    if target not in transitive_closure[nonterminal]:
-                        transitive_closure[nonterminal].add(target)
+        non_unit_productions = {}
+        for nonterminal, rhs_list in rules.items():
+            units = []
+            others = []
+            for rhs in rhs_list:
+                if len(rhs) == 1 and not terminal[rhs[0]]:
+                    units.append(rhs[0])
+                else:
+                    others.append(rhs)
+            unit_productions[nonterminal] = units
+            non_unit_productions[nonterminal] = others
+
+        # resolve unit rules once per strongly connected component of the unit rule graph. Components come out of
+        # __components__ with the ones they point to first, so their productions are always complete already
+        component_of = {}
+        shared = []  # component -> the non-unit productions of its members and everything they reach
+        for members in self.__components__(unit_productions):
+            component = len(shared)
+            for nonterminal in members:
+                component_of[nonterminal] = component
+            new_rhs_list = []
+            seen = set()
+            sources = [non_unit_productions[nonterminal] for nonterminal in members]
+            reached = {component}
+            for nonterminal in members:
+                for target in unit_productions[nonterminal]:
+                    if target in component_of and component_of[target] not in reached:
+                        reached.add(component_of[target])
+                        sources.append(shared[component_of[target]])
+            for rhs_list in sources:
+                for rhs in rhs_list:
+                    if rhs not in seen:
+                        seen.add(rhs)
+                        new_rhs_list.append(rhs)
+            shared.append(new_rhs_list)
+
+        # members of a component share the same list
+        self.rules = {nonterminal: shared[component_of[nonterminal]] for nonterminal in rules}
+
+    @staticmethod
+    def __components__(edges):
+        """Tarjan's algorithm without recursion, yields the strongly connected components of a graph given as
+        {node: [node, ...]} in reverse topological order. Edges to nodes that aren't keys are ignored."""
+        index = {}
+        low = {}
+        stack = []
+        on_stack = set()
+        for root in edges:
+            if root in index:
+                continue
+            index[root] = low[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(edges[root]))]
+            while work:
+                node, targets = work[-1]
+                for target in targets:
+                    if target not in edges:
+                        continue
+                    if target not in index:
+                        index[target] = low[target] = len(index)
                         stack.append(target)
+                        on_stack.add(target)
+                        work.append((target, iter(edges[target])))
+                        break
+                    if target in on_stack:
+                        low[node] = min(low[node], index[target])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+                    if low[node] == index[node]:
+                        members = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            members.append(member)
+                            if member == node:
+                                break
+                        yield members[::-1]
+
+    def iter_strings(self, max_length):
+        """Yields the strings of the language with up to max_length terminals, shortest first and sorted within a
+        length. The strings of every nonterminal are worked out one length at a time, each from the shorter ones,
+        so a length is only computed when the previous one was consumed."""
+        rules = self.compile()
+        names = self.symbols.names
+        start = self.symbols.intern(self.start_symbol)
+        layers = {nonterminal: [] for nonterminal in rules}  # nonterminal -> sets of terminal id tuples by length
+        for length in range(max_length + 1):
+            for layer in layers.values():
+                layer.append(set())
+            # a production can use strings of this same length from a nonterminal when the rest derives ε,
+            # so repeat until nothing is added
+            changed = True
+            while changed:
+                changed = False
+                for nonterminal, rhs_list in rules.items():
+                    layer = layers[nonterminal][length]
+                    size = len(layer)
+                    for rhs in rhs_list:
+                        layer.update(self.__strings__(rhs, length, layers))
+                    changed = changed or len(layer) != size
+            if start in layers:
+                yield from sorted(''.join(names[symbol] for symbol in string) for string in layers[start][length])
 
-        # create new productions by substituting unit rules
-        new_productions = {}
-        for nonterminal, productions in self.productions.items():
-            if nonterminal not in new_productions:
-                new_productions[nonterminal] = []
+    def __strings__(self, rhs, length, layers):
+        """The strings of exactly length terminals that rhs derives, from the layers computed so far"""
+        terminal = self.symbols.terminal
+        partial = {0: {()}}  # number of terminals -> prefixes derived by the symbols seen so far
+        for symbol in rhs:
+            if symbol == EPSILON:
+                continue
+            extended = {}
+            for used, prefixes in partial.items():
+                if terminal[symbol]:
+                    if used < length:
+                        extended.setdefault(used + 1, set()).update(prefix + (symbol,) for prefix in prefixes)
+                    continue
+                for size, suffixes in enumerate(layers.get(symbol, ())[:length - used + 1]):
+                    if suffixes:
+                        extended.setdefault(used + size, set()).update(prefix + suffix for prefix in prefixes
+                                                                       for suffix in suffixes)
+            partial = extended
+        return partial.get(length, ())
 
-            # add non-unit productions directly
-            non_unit_prods = [rhs for rhs in productions if not (len(rhs) == 1 and rhs[0].isupper())]
-            new_productions[nonterminal].extend(non_unit_prods)
+    def derivation_counts(self, max_length):
+        """Converts a copy of the grammar to CNF and counts the derivations of each of its nonterminals for every
+        length up to max_length. Returns the copy and {nonterminal id: [count for each length]}."""
+        cnf = Grammar(self.start_symbol, copy.deepcopy(self.productions))
+        cnf.to_cnf(reduce_after=True)
+        rules = cnf.compile()
+        terminal = cnf.symbols.terminal
+        counts = {nonterminal: [0] * (max_length + 1) for nonterminal in rules}
+        binary = []
+        for nonterminal, rhs_list in rules.items():
+            for rhs in rhs_list:
+                if len(rhs) == 2:
+                    binary.append((nonterminal, rhs[0], rhs[1]))
+                elif rhs[0] == EPSILON:
+                    counts[nonterminal][0] += 1
+                elif terminal[rhs[0]] and max_length >= 1:
+                    counts[nonterminal][1] += 1
+        # ε is only produced by the start symbol, which no production uses, so both parts have at least one terminal
+        for length in range(2, max_length + 1):
+            for nonterminal, left, right in binary:
+                left_counts, right_counts = counts[left], counts[right]
+                counts[nonterminal][length] += sum(left_counts[size] * right_counts[length - size]
+                                                   for size in range(1, length))
+        return cnf, counts
 
-            # replacing unit rules with the productions of their targets
-            for target in transitive_closure[nonterminal]:
-                new_productions[nonterminal].extend(
-                    rhs for rhs in self.productions[target] if not (len(rhs) == 1 and rhs[0].isupper())
-                )
+    def count_strings(self, length):
+        """Number of strings of the given length, without generating them.
 
-        self.productions = new_productions
+        It counts derivations in the CNF of the grammar, so a string with several parse trees there is counted more
+        than once. For an unambiguous grammar it's the number of strings.
+        """
+        cnf, counts = self.derivation_counts(length)
+        start = cnf.symbols.ids.get(cnf.start_symbol)
+        return counts[start][length] if start in counts else 0
 
     def __str__(self):
         return "\n".join(f"{nt} -> {' | '.join(' '.join(sym for sym in prod) for prod in prods)}"
@@ -0,0 +1,45 @@
+EPSILON = 0  # id of 'ε' in every table
+
+
+class SymbolTable:
+    """Maps symbol names to consecutive integer ids.
+
+    A symbol is a nonterminal if its name has an uppercase letter (S, A1, N_a), anything else is a terminal.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+        self.terminal = bytearray()  # terminal[id] is 1 for terminals
+        self.intern('ε')
+
+    def intern(self, name):
+        symbol = self.ids.get(name)
+        if symbol is None:
+            symbol = len(self.names)
+            self.names.append(name)
+            self.ids[name] = symbol
+            self.terminal.append(not any(char.isupper() for char in name))
+        return symbol
+
+    def encode(self, productions):
+        """Turns {name: [[name, ...], ...]} into {id: [(id, ...), ...]}"""
+        ids, intern = self.ids, self.intern
+        rules = {}
+        for nonterminal, rhs_list in productions.items():
+            encoded = []
+            for rhs in rhs_list:
+                try:
+                    encoded.append(tuple([ids[symbol] for symbol in rhs]))
+                except KeyError:  # the slow path only runs for rules with a new symbol
+                    encoded.append(tuple([intern(symbol) for symbol in rhs]))
+            rules[intern(nonterminal)] = encoded
+        return rules
+
+    def decode(self, rules):
+        names = self.names
+        return {names[nonterminal]: [[names[symbol] for symbol in rhs] for rhs in rhs_list]
+                for nonterminal, rhs_list in rules.items()}
+
+    def __len__(self):
+        return len(self.names)
@@ -0,0 +1,143 @@
+import argparse
+import random
+import time
+
+from CYK import CYK
+from Earley import Earley
+from Grammar import Grammar
+
+SIZES = [100, 1_000, 10_000, 50_000]
+TERMINALS = 'abcdefghij'
+
+
+def make_grammar(rule_count, seed=0):
+    """A random grammar with about rule_count productions over rule_count // 4 nonterminals.
+
+    Most productions are 1-5 symbols long, a few are ε or unit rules, like in the hand written grammars of the lab.
+    """
+    rng = random.Random(seed)
+    nonterminals = [f"X{index}" for index in range(max(1, rule_count // 4))]
+    productions = {nonterminal: [[rng.choice(TERMINALS)]] for nonterminal in nonterminals}
+    for _ in range(rule_count - len(nonterminals)):
+        kind = rng.random()
+        if kind < 0.02:
+            rhs = ['ε']
+        elif kind < 0.05:
+            rhs = [rng.choice(nonterminals)]
+        else:
+            rhs = [rng.choice(nonterminals) if rng.random() < 0.6 else rng.choice(TERMINALS)
+                   for _ in range(rng.randint(2, 5))]
+        productions[rng.choice(nonterminals)].append(rhs)
+    return Grammar(nonterminals[0], productions)
+
+
+def make_nullable_chain(depth):
+    """X0 -> a X1 X1, X1 -> a X2 X2, ... and the last one is nullable, so every X is nullable.
+
+    The rules are listed from the top, so a rescan of all rules finds only one new nullable nonterminal per pass.
+    """
+    productions = {f"X{index}": [["a", f"X{index + 1}", f"X{index + 1}"], [f"X{index + 1}"]] for index in range(depth)}
+    productions[f"X{depth}"] = [["b"], ["ε"]]
+    return Grammar("X0", productions)
+
+
+def make_unit_chain(depth):
+    """An expression grammar with depth precedence levels: L0 -> L0 x0 L1 | L1, ..., and a ring of depth unit
+    rules R0 -> R1, ..., R(depth - 1) -> R0 next to it.
+
+    Every level ends up with the productions of all the levels below it, while the ring is a single component.
+    """
+    productions = {f"L{index}": [[f"L{index}", f"x{index}", f"L{index + 1}"], [f"L{index + 1}"]]
+                   for index in range(depth)}
+    productions[f"L{depth}"] = [["(", "L0", ")"], ["a"]]
+    for index in range(depth):
+        productions[f"R{index}"] = [[f"R{(index + 1) % depth}"], [f"r{index}"]]
+    return Grammar("L0", productions)
+
+
+def run(max_size, seed):
+    print(f"{'rules':>10} {'helpers':>10} {'cnf rules':>10} {'seconds':>10}")
+    for size in SIZES:
+        if size > max_size:
+            break
+        for share_suffixes in (False, True):
+            grammar = make_grammar(size, seed)
+            start = time.perf_counter()
+            grammar.to_cnf(share_suffixes)
+            elapsed = time.perf_counter() - start
+            result = sum(len(rhs_list) for rhs_list in grammar.productions.values())
+            print(f"{size:>10} {'shared' if share_suffixes else 'fresh':>10} {result:>10} {elapsed:>10.4f}")
+
+
+def run_nullable(max_depth):
+    print(f"\n{'chain depth':>12} {'nullable':>10} {'rules':>10} {'seconds':>10}")
+    depth = 1_000
+    while depth <= max_depth:
+        grammar = make_nullable_chain(depth)
+        start = time.perf_counter()
+        nullable = grammar.nullable_symbols()
+        grammar.eliminate_epsilon_rules()
+        elapsed = time.perf_counter() - start
+        print(f"{depth:>12} {len(nullable):>10} {sum(map(len, grammar.rules.values())):>10} {elapsed:>10.4f}")
+        depth *= 10
+
+
+def run_units(max_depth):
+    print(f"\n{'unit depth':>12} {'rules':>10} {'stored':>10} {'seconds':>10}")
+    depth = 10
+    while depth <= max_depth:
+        grammar = make_unit_chain(depth)
+        start = time.perf_counter()
+        grammar.eliminate_unit_rules()
+        elapsed = time.perf_counter() - start
+        rules = sum(map(len, grammar.rules.values()))
+        distinct = {id(rhs_list): rhs_list for rhs_list in grammar.rules.values()}  # lists shared by a component
+        stored = sum(map(len, distinct.values()))
+        print(f"{depth:>12} {rules:>10} {stored:>10} {elapsed:>10.4f}")
+        depth *= 10
+
+
+def run_parsers(max_length):
+    """Earley on an expression grammar as it is, CYK on its CNF"""
+    productions = {"E": [["E", "+", "T"], ["T"]], "T": [["T", "*", "F"], ["F"]], "F": [["(", "E", ")"], ["a"]]}
+    earley = Earley(Grammar("E", {nonterminal: list(rhs_list) for nonterminal, rhs_list in productions.items()}))
+    cnf = Grammar("E", productions)
+    cnf.to_cnf()
+    cyk = CYK(cnf)
+    print(f"\n{'length':>10} {'parser':>10} {'seconds':>10}")
+    length = 10
+    while length <= max_length:
+        word = "a+a*(a+a)*" * (length // 10) + "a"
+        for name, accepts in [('Earley', earley.recognize), ('CYK', cyk.accepts)]:
+            if name == 'CYK' and length > 100:
+                continue  # cubic, a 1000 symbol word already takes many seconds
+            start = time.perf_counter()
+            accepts(word)
+            print(f"{length:>10} {name:>10} {time.perf_counter() - start:>10.4f}")
+        length *= 10
+
+
+def run_profile(size, seed):
+    grammar = make_grammar(size, seed)
+    print(f"\nstages of to_cnf() on {size} rules")
+    print(f"{'stage':>8} {'seconds':>10} {'peak bytes':>12} {'nonterminals':>14} {'productions':>12} {'symbols':>10}")
+    for stage in grammar.to_cnf(profile=True):
+        after = stage['after']
+        print(f"{stage['stage']:>8} {stage['seconds']:>10.4f} {stage['peak_bytes']:>12} "
+              f"{after['nonterminals']:>14} {after['productions']:>12} {after['symbols']:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time Grammar.to_cnf() on growing random grammars")
+    parser.add_argument('--max-size', type=int, default=SIZES[-1], help="largest number of productions")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-depth', type=int, default=100_000, help="longest chain of nullable nonterminals")
+    parser.add_argument('--max-unit-depth', type=int, default=1_000, help="longest chain of unit rules")
+    parser.add_argument('--profile-size', type=int, default=10_000, help="grammar size for the per-stage report")
+    parser.add_argument('--max-length', type=int, default=100_000, help="longest word given to the parsers")
+    args = parser.parse_args()
+    run(args.max_size, args.seed)
+    run_nullable(args.max_depth)
+    run_units(args.max_unit_depth)
+    run_parsers(args.max_length)
+    run_profile(args.profile_size, args.seed)
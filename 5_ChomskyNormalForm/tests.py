@@ -1,50 +1,19 @@
 import copy
+import os
+import random
+import tempfile
+import time
+import tracemalloc
 import unittest
 from Grammar import Grammar
+from CYK import CYK
+from CNFCache import CNFCache
+from Earley import Earley
+from Equivalence import check_equivalence, Sampler
 
 
-def generate_expressions(grammar, start_symbol, depth_limit):
-    if depth_limit == 0:
-        return set()  # Avoid infinite recursion by stopping at a depth limit
-
-    expressions = set()
-    if start_symbol not in grammar.productions:
-        return expressions  # If no production rules, return empty set
-
-    for production in grammar.productions[start_symbol]:
-        # If production is a terminal
-        if all(symbol.islower() or symbol == 'ε' for symbol in production):
-            expressions.add(''.join(symbol for symbol in production if symbol != 'ε'))
-        else:
-            # Generate combinations of nonterminal expansions
-            current_combinations = ['']
-            for symbol in production:
-                new_combinations = []
-                if symbol.islower():  # Terminal
-                    for combo in current_combinations:
-                        new_combinations.append(combo + symbol)
-                else:  # Non-terminal
-                    expansions = generate_expressions(grammar, symbol, depth_limit - 1)
-                    if not expansions:  # If no expansions, continue with what we have
-                        expansions = ['']
-                    for combo in current_combinations:
-                        for expansion in expansions:
-                            new_combinations.append(combo + expansion)
-                current_combinations = new_combinations
-            expressions.update(current_combinations)
-
-    return expressions
-
-
-def compare_grammars(grammar1, grammar2, depth_limit):
-    expressions1 = generate_expressions(grammar1, grammar1.start_symbol, depth_limit)
-    expressions2 = generate_expressions(grammar2, grammar2.start_symbol, depth_limit)
-
-    # Compare sets of expressions
-    if expressions1 == expressions2:
-        return True
-    else:
-        return False
+def compare_grammars(grammar1, grammar2, max_length):
+    return set(grammar1.iter_strings(max_length)) == set(grammar2.iter_strings(max_length))
 
 
 class TestSTART(unittest.TestCase):
@@ -76,11 +45,11 @@ class TestSTART(unittest.TestCase):
 
     def perform_basic_actions(self, grammar):
         print(f"before: \n{grammar}")
-        print(generate_expressions(grammar, grammar.start_symbol, 3))
+        print(list(grammar.iter_strings(3)))
         original_grammar = copy.deepcopy(grammar)
         grammar.eliminate_start_symbol()
         print(f"\n\nafter: \n{grammar}")
-        print(generate_expressions(grammar, grammar.start_symbol, 3))
+        print(list(grammar.iter_strings(3)))
         self.assertTrue(compare_grammars(original_grammar, grammar, 3),
                         "The grammars should generate the same language after transformation.")
         return grammar
@@ -134,11 +103,11 @@ class TestTERM(unittest.TestCase):
 
     def perform_basic_actions(self, grammar):
         print(f"before: \n{grammar}")
-        print(generate_expressions(grammar, grammar.start_symbol, 3))
+        print(list(grammar.iter_strings(3)))
         original_grammar = copy.deepcopy(grammar)
         grammar.eliminate_nonsolitary_terminals()
         print(f"\n\nafter: \n{grammar}")
-        print(generate_expressions(grammar, grammar.start_symbol, 3))
+        print(list(grammar.iter_strings(3)))
         self.assertTrue(compare_grammars(original_grammar, grammar, 3),
                         "The grammars should generate the same language after transformation.")
         return grammar
@@ -191,13 +160,29 @@ class TestBIN(unittest.TestCase):
             for production in production_list:
                 self.assertTrue(len(production) <= 2)
 
+    def test_bin_shared_suffixes(self):
+        grammar = Grammar("S",
+                          {
+                              "S": [["A", "B", "C", "D"], ["B", "B", "C", "D"]],
+                              "A": [["C", "C", "D"]]
+                          })
+        original_grammar = copy.deepcopy(grammar)
+        saved = grammar.eliminate_rhs_with_more_than_two_nonterminals(share_suffixes=True)
+
+        # "C D" gets one helper for all three productions, "B C D" one for both productions of S
+        self.assertEqual(saved, 3)
+        self.assertEqual(len(grammar.productions), 4)
+        self.assertEqual(grammar.productions["S"][0][1], grammar.productions["S"][1][1])
+        self.assertTrue(all(len(rhs) == 2 for rhs_list in grammar.productions.values() for rhs in rhs_list))
+        self.assertTrue(compare_grammars(original_grammar, grammar, 5))
+
     def perform_basic_actions(self, grammar):
         print(f"before: \n{grammar}")
-        print(generate_expressions(grammar, grammar.start_symbol, 3))
+        print(list(grammar.iter_strings(3)))
         original_grammar = copy.deepcopy(grammar)
         grammar.eliminate_rhs_with_more_than_two_nonterminals()
         print(f"\n\nafter: \n{grammar}")
-        print(generate_expressions(grammar, grammar.start_symbol, 3))
+        print(list(grammar.iter_strings(3)))
         self.assertTrue(compare_grammars(original_grammar, grammar, 3),
                         "The grammars should generate the same language after transformation.")
         return grammar
@@ -212,12 +197,12 @@ class TestDEL(unittest.TestCase):
                               "B": [["b"]]
                           })
         print(f"before: \n{grammar}")
-        print(generate_expressions(grammar, grammar.start_symbol, 3))
+        print(list(grammar.iter_strings(3)))
 
         original_grammar = copy.deepcopy(grammar)
         grammar.eliminate_epsilon_rules()
         print(f"\n\nafter: \n{grammar}")
-        print(generate_expressions(grammar, grammar.start_symbol, 3))
+        print(list(grammar.iter_strings(3)))
 
 
         self.assertTrue(compare_grammars(original_grammar, grammar, 3),
@@ -234,16 +219,42 @@ class TestDEL(unittest.TestCase):
         })
 
         print(f"before: \n{grammar}")
-        print(generate_expressions(grammar, grammar.start_symbol, 3))
+        print(list(grammar.iter_strings(3)))
 
         original_grammar = copy.deepcopy(grammar)
         grammar.eliminate_epsilon_rules()
         print(f"\n\nafter: \n{grammar}")
-        print(generate_expressions(grammar, grammar.start_symbol, 3))
+        print(list(grammar.iter_strings(3)))
         self.assertTrue(compare_grammars(original_grammar, grammar, 3),
                         "The grammars should remain identical after transformation.")
 
 
+    def test_nullable_variants(self):
+        grammar = Grammar("S",
+                          {
+                              "S": [["A", "b", "A"], ["C", "b"]],
+                              "A": [["a"], ["ε"]],
+                              "C": [["ε"]]
+                          })
+        grammar.eliminate_epsilon_rules()
+
+        # every nullable symbol can be left out, C only derives ε so it's always left out
+        self.assertEqual(grammar.productions["S"], [["A", "b", "A"], ["b", "A"], ["A", "b"], ["b"]])
+        self.assertEqual(grammar.productions["A"], [["a"]])
+        self.assertNotIn("C", grammar.productions)
+
+    def test_nullable_start(self):
+        grammar = Grammar("S",
+                          {
+                              "S": [["A", "A"]],
+                              "A": [["B"], ["a"]],
+                              "B": [["ε"]]
+                          })
+        self.assertEqual({grammar.symbols.names[symbol] for symbol in grammar.nullable_symbols()}, {"S", "A", "B"})
+        grammar.eliminate_epsilon_rules()
+        self.assertEqual(grammar.productions["S"], [["A", "A"], ["A"], ["ε"]])
+
+
 class TestUNIT(unittest.TestCase):
 
     def test_simple_unit_rule_elimination(self):
@@ -303,18 +314,366 @@ class TestUNIT(unittest.TestCase):
         self.assertNotIn(["A"], grammar.productions["B"])
         self.assertNotIn(["B"], grammar.productions["A"])
 
+    def test_shared_cycle_productions(self):
+        grammar = Grammar("S",
+                          {
+                              "S": [["A"], ["a"]],
+                              "A": [["B"], ["a"]],
+                              "B": [["A"], ["b"], ["a"]]
+                          })
+        grammar.eliminate_unit_rules()
+        # A and B reach each other, so they end up with the same productions, without duplicates
+        self.assertEqual(grammar.productions["A"], [["a"], ["b"]])
+        self.assertEqual(grammar.productions["B"], [["a"], ["b"]])
+        self.assertEqual(grammar.productions["S"], [["a"], ["b"]])
+
     def perform_basic_actions(self, grammar):
         print(f"before: \n{grammar}")
-        print(generate_expressions(grammar, grammar.start_symbol, 10))
+        print(list(grammar.iter_strings(10)))
         original_grammar = copy.deepcopy(grammar)
         grammar.eliminate_unit_rules()
         print(f"\n\nafter: \n{grammar}")
-        print(generate_expressions(grammar, grammar.start_symbol, 10))
+        print(list(grammar.iter_strings(10)))
         self.assertTrue(compare_grammars(original_grammar, grammar, 10),
                         "The grammars should generate the same language after transformation.")
         return grammar
 
 
+class TestUSELESS(unittest.TestCase):
+    def test_unreachable_and_non_generating(self):
+        grammar = Grammar("S",
+                          {
+                              "S": [["a", "A"], ["b", "B"]],
+                              "A": [["a"]],
+                              "B": [["b", "B"]],  # never ends, so B generates nothing
+                              "C": [["c"]],  # can't be reached from S
+                          })
+        removed = grammar.remove_useless_symbols()
+        self.assertEqual(removed, 3)
+        self.assertEqual(grammar.productions, {"S": [["a", "A"]], "A": [["a"]]})
+
+    def test_to_cnf_reduce(self):
+        grammar = Grammar("S", {
+            'S': [['A']],
+            'A': [['d'], ['d', 'S'], ['a', 'A', 'd', 'A', 'B']],
+            'B': [['a', 'C'], ['a', 'S'], ['A', 'C']],
+            'C': [['ε']],
+            'E': [['A', 'S']],
+        })
+        grammar.to_cnf(reduce_before=True, reduce_after=True)
+        self.assertNotIn("E", grammar.productions)
+        self.assertTrue(CYK(grammar).accepts("dd"))
+
+
+class TestProfile(unittest.TestCase):
+    def test_report(self):
+        grammar = Grammar("S",
+                          {
+                              "S": [["a", "S", "b", "S"], ["A"]],
+                              "A": [["a"], ["ε"]],
+                              "E": [["e"]]
+                          })
+        stages = []
+        report = grammar.to_cnf(reduce_after=True, callback=stages.append)
+
+        self.assertEqual(report, stages)
+        self.assertEqual([stage["stage"] for stage in report], ["START", "DEL", "TERM", "BIN", "UNIT", "REDUCE"])
+        for previous, stage in zip(report, report[1:]):
+            self.assertEqual(previous["after"], stage["before"])
+        self.assertEqual(report[0]["before"], {"nonterminals": 3, "productions": 5, "symbols": 8})
+        self.assertEqual(report[-1]["after"], grammar.size())
+        self.assertTrue(all(stage["seconds"] >= 0 and stage["peak_bytes"] >= 0 for stage in report))
+
+    def test_caller_peak(self):
+        grammar = Grammar("S", {"S": [["a", "S", "b", "S"], ["A"]], "A": [["a"], ["ε"]]})
+        tracemalloc.start()
+        try:
+            buffer = bytearray(1 << 20)
+            del buffer
+            peak = tracemalloc.get_traced_memory()[1]
+            report = grammar.to_cnf(profile=True)
+        finally:
+            tracemalloc.stop()
+        self.assertGreaterEqual(report[0]["traced_peak_bytes"], peak)
+        for previous, stage in zip(report, report[1:]):
+            self.assertGreaterEqual(stage["traced_peak_bytes"], previous["traced_peak_bytes"])
+
+    def test_saved_helpers(self):
+        rules = {"S": [["A", "B", "C", "D"], ["B", "B", "C", "D"]], "A": [["C", "C", "D"]]}
+        for share_suffixes, saved in ((True, 3), (False, 0)):
+            report = Grammar("S", copy.deepcopy(rules)).to_cnf(share_suffixes=share_suffixes, profile=True)
+            self.assertEqual([stage["saved_helpers"] for stage in report if "saved_helpers" in stage], [saved])
+            self.assertEqual(report[3]["stage"], "BIN")
+
+    def test_removed_productions(self):
+        grammar = Grammar("S",
+                          {
+                              "S": [["a", "S", "b", "S"], ["A"]],
+                              "A": [["a"], ["ε"]],
+                              "E": [["e"]],
+                              "F": [["F", "a"]]
+                          })
+        report = grammar.to_cnf(reduce_before=True, reduce_after=True, profile=True)
+        reduce = [stage for stage in report if stage["stage"] == "REDUCE"]
+        self.assertEqual([stage["removed_productions"] for stage in reduce], [2, 1])
+        for stage in reduce:
+            self.assertEqual(stage["removed_productions"],
+                             stage["before"]["productions"] - stage["after"]["productions"])
+        self.assertTrue(all("removed_productions" not in stage for stage in report if stage["stage"] != "REDUCE"))
+
+    def test_disabled(self):
+        grammar = Grammar("S", {"S": [["a", "b"]]})
+        self.assertIsNone(grammar.to_cnf())
+
+
+class TestCNFCache(unittest.TestCase):
+    def make_grammar(self):
+        return Grammar("S",
+                       {
+                           "S": [["a", "S", "b"], ["A"]],
+                           "A": [["a"], ["ε"]]
+                       })
+
+    def test_hit_and_miss(self):
+        with tempfile.TemporaryDirectory() as directory:
+            expected = self.make_grammar()
+            expected.to_cnf()
+
+            cache = CNFCache(directory)
+            first = cache.to_cnf(self.make_grammar())
+            second = CNFCache(directory).to_cnf(self.make_grammar())  # a new instance reads the same directory
+            self.assertEqual((cache.hits, cache.misses), (0, 1))
+            self.assertEqual(first.productions, expected.productions)
+            self.assertEqual(second.productions, expected.productions)
+            self.assertEqual(second.start_symbol, expected.start_symbol)
+
+            # the options are part of the key
+            cache.to_cnf(self.make_grammar(), share_suffixes=True)
+            self.assertEqual((cache.hits, cache.misses), (0, 2))
+            # but only the ones that change the result, and defaults given explicitly are the same entry
+            cache.to_cnf(self.make_grammar(), reduce_before=False)
+            self.assertEqual((cache.hits, cache.misses), (1, 2))
+            with self.assertRaises(TypeError):
+                cache.to_cnf(self.make_grammar(), profile=True)
+
+    def test_invalidate(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = CNFCache(directory)
+            cache.to_cnf(self.make_grammar())
+            self.assertEqual(cache.invalidate(self.make_grammar()), 1)
+            cache.to_cnf(self.make_grammar())
+            cache.to_cnf(Grammar("S", {"S": [["a"]]}))
+            self.assertEqual(cache.invalidate(), 2)
+            cache.to_cnf(self.make_grammar())
+            self.assertEqual((cache.hits, cache.misses), (0, 4))
+
+    def test_eviction(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = CNFCache(directory, max_size=1)  # room for the newest entry only
+            cache.to_cnf(self.make_grammar())
+            cache.to_cnf(Grammar("S", {"S": [["a"]]}))
+            self.assertEqual(len(os.listdir(directory)), 1)
+            cache.to_cnf(Grammar("S", {"S": [["a"]]}))
+            cache.to_cnf(self.make_grammar())
+            self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+
+class TestEnumeration(unittest.TestCase):
+    def test_iter_strings(self):
+        grammar = Grammar("S",
+                          {
+                              "S": [["a", "S", "b"], ["A"]],
+                              "A": [["c"], ["ε"]]
+                          })
+        self.assertEqual(list(grammar.iter_strings(4)), ["", "c", "ab", "acb", "aabb"])
+
+    def test_count_strings(self):
+        grammar = Grammar("E",
+                          {
+                              "E": [["E", "+", "T"], ["T"]],
+                              "T": [["T", "*", "F"], ["F"]],
+                              "F": [["(", "E", ")"], ["a"]]
+                          })
+        strings = list(grammar.iter_strings(9))
+        for length in range(10):
+            self.assertEqual(grammar.count_strings(length), sum(len(string) == length for string in strings))
+        self.assertGreater(grammar.count_strings(51), 10 ** 17)  # far too many to list
+
+
+class TestEquivalence(unittest.TestCase):
+    def test_to_cnf(self):
+        grammar = Grammar("S",
+                          {
+                              "S": [["A", "b", "A"], ["S", "S"]],
+                              "A": [["a"], ["ε"]]
+                          })
+        cnf = copy.deepcopy(grammar)
+        cnf.to_cnf()
+        for mode in ("uniform", "derivation"):
+            report = check_equivalence(grammar, cnf, samples=200, max_length=12, mode=mode, workers=1)
+            self.assertEqual((report["first_only"], report["second_only"]), ([], []))
+
+    def test_counterexamples(self):
+        grammar = Grammar("S", {"S": [["A", "b", "A"]], "A": [["a"], ["ε"]]})
+        broken = Grammar("S", {"S": [["b"], ["A", "b", "A"]], "A": [["a"]]})  # lost "ab" and "ba"
+        report = check_equivalence(grammar, broken, samples=100, max_length=3, workers=2)
+        self.assertEqual(sorted(report["first_only"]), ["ab", "ba"])
+        self.assertEqual(report["second_only"], [])
+
+    def test_uniform_lengths(self):
+        sampler = Sampler(Grammar("S", {"S": [["a", "S"], ["b", "S"], ["ε"]]}), 3)
+        rng = random.Random(0)
+        strings = [sampler.uniform(rng) for _ in range(4000)]
+        self.assertEqual({len(string) for string in strings}, {0, 1, 2, 3})
+        self.assertEqual(len({string for string in strings if len(string) == 3}), 8)
+
+
+class TestCYK(unittest.TestCase):
+    def test_cnf_grammar(self):
+        # a^n b^n, n >= 1
+        grammar = Grammar("S",
+                          {
+                              "S": [["A", "X"], ["A", "B"]],
+                              "X": [["S", "B"]],
+                              "A": [["a"]],
+                              "B": [["b"]]
+                          })
+        cyk = CYK(grammar)
+        self.assertTrue(cyk.accepts("ab"))
+        self.assertTrue(cyk.accepts("aaabbb"))
+        self.assertTrue(cyk.accepts(["a", "a", "b", "b"]))
+        self.assertFalse(cyk.accepts(""))
+        self.assertFalse(cyk.accepts("aab"))
+        self.assertFalse(cyk.accepts("abab"))
+        self.assertFalse(cyk.accepts("abc"))
+
+    def test_after_to_cnf(self):
+        grammar = Grammar("S",
+                          {
+                              "S": [["a", "S", "b"], ["a", "b"]]
+                          })
+        grammar.to_cnf()
+        cyk = CYK(grammar)
+        self.assertEqual(cyk.accepts_all(["ab", "aabb", "aab", "ab", "ba", "aaabbb"]),
+                         [True, True, False, True, False, True])
+
+    def test_empty_word(self):
+        grammar = Grammar("S0",
+                          {
+                              "S0": [["ε"], ["a"]]
+                          })
+        cyk = CYK(grammar)
+        self.assertTrue(cyk.accepts(""))
+        self.assertTrue(cyk.accepts("a"))
+        self.assertFalse(cyk.accepts("aa"))
+
+    def test_not_cnf(self):
+        grammar = Grammar("S",
+                          {
+                              "S": [["A", "B", "C"]]
+                          })
+        with self.assertRaises(ValueError):
+            CYK(grammar)
+
+    def test_terminal_in_binary_rule(self):
+        grammar = Grammar("S",
+                          {
+                              "S": [["a", "B"]],
+                              "B": [["b"]]
+                          })
+        with self.assertRaises(ValueError):
+            CYK(grammar)
+
+    def test_undefined_nonterminal(self):
+        with self.assertRaises(ValueError):
+            CYK(Grammar("S", {"S": [["X"]]}))
+        # in a binary rule it's allowed, it just derives nothing
+        cyk = CYK(Grammar("S", {"S": [["A", "X"], ["A", "A"]], "A": [["a"]]}))
+        self.assertTrue(cyk.accepts("aa"))
+        self.assertFalse(cyk.accepts(["a", "X"]))
+
+
+class TestEarley(unittest.TestCase):
+    def test_expressions(self):
+        grammar = Grammar("E",
+                          {
+                              "E": [["E", "+", "T"], ["T"]],
+                              "T": [["T", "*", "F"], ["F"]],
+                              "F": [["(", "E", ")"], ["a"]]
+                          })
+        earley = Earley(grammar)
+        self.assertTrue(earley.recognize("a+a*(a+a)"))
+        self.assertTrue(earley.recognize(["a", "*", "a"]))
+        self.assertFalse(earley.recognize("a+*a"))
+        self.assertFalse(earley.recognize(""))
+        self.assertFalse(earley.recognize("a+b"))
+
+        forest = earley.parse("a+a*a")
+        self.assertEqual(forest.count(), 1)
+        self.assertEqual(forest.tree(), ("E", [("E", [("T", [("F", ["a"])])]), "+",
+                                               ("T", [("T", [("F", ["a"])]), "*", ("F", ["a"])])]))
+
+    def test_epsilon(self):
+        earley = Earley(Grammar("S",
+                                {
+                                    "S": [["a", "S", "b"], ["A"]],
+                                    "A": [["ε"]]
+                                }))
+        self.assertEqual([earley.recognize(word) for word in ["", "ab", "aabb", "aab", "ba"]],
+                         [True, True, True, False, False])
+        self.assertEqual(earley.parse("ab").tree(), ("S", ["a", ("S", [("A", [])]), "b"]))
+
+    def test_ambiguous(self):
+        earley = Earley(Grammar("S", {"S": [["S", "S"], ["a"]]}))
+        # the number of binary trees with n leaves
+        self.assertEqual([earley.parse("a" * n).count() for n in range(1, 8)], [1, 1, 2, 5, 14, 42, 132])
+        self.assertIsNone(earley.parse("b"))
+
+        cyclic = Earley(Grammar("S", {"S": [["S"], ["a"]]})).parse("a")
+        self.assertEqual(cyclic.count(), float('inf'))
+        self.assertEqual(cyclic.tree(), ("S", ["a"]))
+
+    def test_right_recursion(self):
+        earley = Earley(Grammar("S", {"S": [["A", "S"], ["A"]], "A": [["a"]]}))
+        forest = earley.parse("aaaa")
+        self.assertEqual(forest.count(), 1)
+        self.assertEqual(forest.tree(), ("S", [("A", ["a"]), ("S", [("A", ["a"]), ("S", [("A", ["a"]),
+                                              ("S", [("A", ["a"])])])])]))
+        self.assertFalse(earley.recognize("aab"))
+
+    def test_right_recursion_scales_linearly(self):
+        earley = Earley(Grammar("S", {"S": [["a", "S"], ["a"]]}))
+
+        def seconds(length):
+            word = "a" * length
+            best = float('inf')
+            for _ in range(3):
+                start = time.perf_counter()
+                self.assertTrue(earley.recognize(word))
+                best = min(best, time.perf_counter() - start)
+            return best
+
+        # 4 times the input takes about 4 times as long, without Leo's optimization it was over 16 times
+        self.assertLess(seconds(4000) / seconds(1000), 8)
+        self.assertEqual(earley.parse("a" * 3000).count(), 1)
+
+    def test_same_as_cyk(self):
+        productions = {
+            'S': [['A']],
+            'A': [['d'], ['d', 'S'], ['a', 'A', 'd', 'A', 'B']],
+            'B': [['a', 'C'], ['a', 'S'], ['A', 'C']],
+            'C': [['ε']],
+        }
+        earley = Earley(Grammar("S", copy.deepcopy(productions)))
+        cnf = Grammar("S", copy.deepcopy(productions))
+        cnf.to_cnf()
+        cyk = CYK(cnf)
+        for length in range(7):
+            for number in range(3 ** length):
+                word = "".join("adb"[number // 3 ** index % 3] for index in range(length))
+                self.assertEqual(earley.recognize(word), cyk.accepts(word), word)
+
+
 if __name__ == "__main__":
     unittest.main()
 
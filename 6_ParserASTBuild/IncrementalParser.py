@@ -0,0 +1,234 @@
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+
+from main import TokenKind, Parser, iter_tokens, lookahead_end
+
+BLOCK_SIZE = 64  # segments per block, a block is split once it holds more than twice as many
+
+
+class IncrementalParser:
+    """Keeps the AST of a document up to date while the document is being edited.
+
+    The text is split into segments at the NEWLINE tokens that end a heading or a paragraph, so every segment except
+    the last one is exactly one child of root. Lexing from the start of a segment doesn't depend on anything before
+    it, and for every segment we remember how far the lexer looked into the text (its reach). An edit only re-lexes
+    and re-parses the segments that looked at the edited text, and stops as soon as a new segment ends where an old
+    one ended.
+
+    Every segment keeps its own text, node and reach as [text, node, reach], and segments are grouped into blocks of
+    about BLOCK_SIZE. An edit joins the texts of the segments it touches into a small window, applies the edit there
+    and lexes the window with local offsets, then replaces the touched segments inside their blocks. Block starts
+    after an edit move by the same amount, so instead of updating all of them the shift is stored once and only
+    applied to the starts between two consecutive edits (like the gap of a gap buffer). root.children is a view of
+    the nodes in the blocks, so the work of an edit depends on the segments it touches, not on the document.
+    """
+
+    def __init__(self, text):
+        self.root = Parser().root
+        self.root.children = SegmentNodes(self)
+        self.blocks = []  # lists of segments
+        self.starts = []  # block starts, from shift_from on the stored starts are missing shift
+        self.reaches = []  # reach of every block, relative to its start
+        self.spills = []  # ascending indices of the blocks that looked past their own end (e.g. an unclosed link)
+        self.shift_from = 0
+        self.shift = 0
+        self.length = len(text)
+
+        segments = []
+        position = 0
+        while True:
+            node, end, reach = self.__parse_segment__(text, position)
+            segments.append([text[position:end], node, reach - position])
+            if node is None:
+                break
+            position = end
+        self.__replace__(0, 0, segments, 0)
+        self.count = len(segments)  # one more than the children of root
+
+    @property
+    def text(self):
+        """The whole document, joined from the segments"""
+        return ''.join(text for block in self.blocks for text, _, _ in block)
+
+    def start(self, index):
+        """Start of the block at index in the current text"""
+        return self.starts[index] + self.shift if index >= self.shift_from else self.starts[index]
+
+    def edit(self, offset, deleted, inserted):
+        """Replaces deleted characters at offset with the inserted text and returns the updated root"""
+        delta = len(inserted) - deleted
+
+        # the block with the edit is affected, blocks before it only if their lookahead reached the edit
+        first = self.__bisect__(offset) - 1
+        for index in self.spills:
+            if index >= first:
+                break
+            if self.start(index) + self.reaches[index] > offset:
+                first = index
+                break
+        # and in it the first segment that looked at the edited text. every segment reaches at least its own end
+        position = self.start(first)
+        segment = 0
+        while position + self.blocks[first][segment][2] <= offset:
+            position += len(self.blocks[first][segment][0])
+            segment += 1
+
+        # the window starts with the old segments up to the end of the deleted text, with the edit applied
+        locations = self.__locations__(first, segment)
+        location = next(locations)
+        parts = []
+        end = position
+        while location[0] < len(self.blocks) and (not parts or end < offset + deleted):
+            parts.append(self.blocks[location[0]][location[1]][0])
+            end += len(parts[-1])
+            location = next(locations)
+        window = ''.join(parts)
+        window = window[:offset - position] + inserted + window[offset - position + deleted:]
+        boundaries = {}  # window position -> location of the old segment that starts there
+        if location[0] < len(self.blocks):
+            boundaries[len(window)] = location
+
+        # new segments are parsed before anything is changed, so a SyntaxError leaves the parser as it was
+        segments = []
+        local = 0
+        while True:
+            node, end, reach = self.__parse_segment__(window, local)
+            if (node is None or reach > len(window)) and location[0] < len(self.blocks):
+                # the segment ran into the end of the window: take in at least as much text again and parse it again
+                parts = []
+                size = 0
+                while location[0] < len(self.blocks) and (not parts or size < len(window) - local):
+                    parts.append(self.blocks[location[0]][location[1]][0])
+                    size += len(parts[-1])
+                    location = next(locations)
+                    if location[0] < len(self.blocks):
+                        boundaries[len(window) + size] = location
+                window += ''.join(parts)
+                continue
+            segments.append([window[local:end], node, reach - local])
+            if node is None:
+                last = location  # lexed up to the end of the text
+                break
+            if end >= offset - position + len(inserted) and end in boundaries:
+                last = boundaries[end]  # back in sync, segments from last on are the same, only shifted
+                break
+            local = end
+
+        # the blocks from the one with the first segment to the one with last are rebuilt around the new segments
+        first_block, last_block = first, last[0] + (last[1] > 0)
+        removed = sum(len(block) for block in self.blocks[first_block:last_block])
+        segments = self.blocks[first][:segment] + segments
+        if last[1]:
+            segments += self.blocks[last[0]][last[1]:]
+        self.__move_shift__(last_block)
+        self.__replace__(first_block, last_block, segments, self.start(first_block))
+        self.shift += delta
+        self.length += delta
+        self.count += len(segments) - removed
+        return self.root
+
+    def __replace__(self, first, last, segments, position):
+        """Replaces blocks first to last - 1, whose starts are all up to date, by blocks of segments from position"""
+        pieces = 1 if len(segments) <= 2 * BLOCK_SIZE else len(segments) // BLOCK_SIZE
+        blocks, starts, reaches, spills = [], [], [], []
+        for piece in range(pieces):
+            block = segments[len(segments) * piece // pieces:len(segments) * (piece + 1) // pieces]
+            length = reach = 0
+            for text, _, segment_reach in block:
+                if length + segment_reach > reach:
+                    reach = length + segment_reach
+                length += len(text)
+            if reach > length:
+                spills.append(first + len(blocks))
+            blocks.append(block)
+            starts.append(position)
+            reaches.append(reach)
+            position += length
+
+        self.blocks[first:last] = blocks
+        self.starts[first:last] = starts
+        self.reaches[first:last] = reaches
+        self.shift_from = first + len(blocks)
+        low, high = bisect_left(self.spills, first), bisect_left(self.spills, last)
+        moved = len(blocks) - (last - first)
+        if moved:
+            self.spills[high:] = [index + moved for index in self.spills[high:]]
+        self.spills[low:high] = spills
+
+    def __locations__(self, block, index):
+        """Yields (block, index) of the segments from the given one on, then (len(blocks), 0) forever"""
+        while block < len(self.blocks):
+            yield from ((block, position) for position in range(index, len(self.blocks[block])))
+            block, index = block + 1, 0
+        while True:
+            yield block, 0
+
+    def __bisect__(self, position):
+        """bisect_right over the block starts of the current text"""
+        index = bisect_right(self.starts, position, 0, self.shift_from)
+        if index < self.shift_from:
+            return index
+        return bisect_right(self.starts, position - self.shift, self.shift_from)
+
+    def __move_shift__(self, index):
+        """Applies or removes the pending shift for the starts between shift_from and index"""
+        if self.shift_from < index:
+            self.starts[self.shift_from:index] = [start + self.shift for start in self.starts[self.shift_from:index]]
+        elif index < self.shift_from:
+            self.starts[index:self.shift_from] = [start - self.shift for start in self.starts[index:self.shift_from]]
+        self.shift_from = index
+
+    @staticmethod
+    def __parse_segment__(text, start):
+        """Parses the segment at start, returns its node (None for the last segment), its end and its reach"""
+        parser = Parser()
+        reach = start
+        has_contents = False
+        for token in iter_tokens(text, start=start):
+            parser.feed(token)
+            if token.kind == TokenKind.NEWLINE:
+                if has_contents:
+                    end = token.position + 1
+                    return parser.root.children[0], end, max(reach, end)
+            else:
+                has_contents = True
+                if text[token.position] in '[!':
+                    reach = max(reach, lookahead_end(text, token.position))
+        return None, len(text), len(text) + 1
+
+
+class SegmentNodes(Sequence):
+    """The children of the root of an IncrementalParser, read straight from its blocks.
+
+    Iterating goes through the blocks in order, indexing first walks them to the right one.
+    """
+
+    def __init__(self, parser):
+        self.parser = parser
+
+    def __len__(self):
+        return self.parser.count - 1  # the last segment has no node
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("child index out of range")
+        for block in self.parser.blocks:
+            if index < len(block):
+                return block[index][1]
+            index -= len(block)
+
+    def __iter__(self):
+        for block in self.parser.blocks:
+            for _, node, _ in block:
+                if node is not None:
+                    yield node
+
+    def __reversed__(self):
+        for block in reversed(self.parser.blocks):
+            for _, node, _ in reversed(block):
+                if node is not None:
+                    yield node
@@ -0,0 +1,113 @@
+import mmap
+import re
+from array import array
+
+from main import TokenKind, Token, MASTER_PATTERN, TOKEN_PATTERNS
+
+KINDS = [kind for kind, _ in TOKEN_PATTERNS] + [TokenKind.OTHER]
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+PATTERNS = dict(TOKEN_PATTERNS)
+
+# the same patterns for lexing bytes. \s only matches ASCII whitespace there, so e.g. a non-breaking space ends up
+# inside a TEXT token instead of being skipped
+BYTES_MASTER_PATTERN = re.compile(MASTER_PATTERN.pattern.encode())
+BYTES_PATTERNS = {kind: re.compile(pattern.pattern.encode()) for kind, pattern in TOKEN_PATTERNS}
+
+
+def count_newlines(text, start, end):
+    if isinstance(text, (str, bytes)):
+        return text.count('\n' if isinstance(text, str) else b'\n', start, end)
+    count = 0  # mmap has no count()
+    position = text.find(b'\n', start, end)
+    while position != -1:
+        count += 1
+        position = text.find(b'\n', position + 1, end)
+    return count
+
+
+class TokenStore:
+    """Compact storage for the tokens of a text.
+
+    Kinds, start/end offsets and line numbers are kept in parallel arrays, token values are sliced from the text
+    only when a token is read. Indexing or iterating the store gives the same Token objects as fast_lexer().
+
+    text can also be bytes or a memory-mapped file (see from_file), then offsets are byte positions and values are
+    decoded from UTF-8 when they're read.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.kinds = array('B')
+        self.starts = array('q')
+        self.ends = array('q')
+        self.lines = array('I')  # 1-based line of the token start
+        self.__scan__()
+
+    @classmethod
+    def from_file(cls, path):
+        """Lexes a file directly from a read-only memory map of it, without reading it into memory first"""
+        with open(path, 'rb') as file:
+            if file.seek(0, 2) == 0:
+                return cls(b'')  # empty files can't be mapped
+            return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def close(self):
+        if isinstance(self.text, mmap.mmap):
+            self.text.close()
+
+    def __scan__(self):
+        text = self.text
+        match_at = (MASTER_PATTERN if isinstance(text, str) else BYTES_MASTER_PATTERN).match
+        kinds, starts, ends, lines = self.kinds, self.starts, self.ends, self.lines
+        text_code, other_code = KIND_CODES[TokenKind.TEXT], KIND_CODES[TokenKind.OTHER]
+        position = 0
+        line = 1
+        line_position = 0  # position up to which newlines were counted
+        while position < len(text):
+            match = match_at(text, position)
+            if match is None:
+                code, end = other_code, position + 1
+                print("Can't match token to any pattern")
+            else:
+                kind, end = match.lastgroup, match.end()
+                if kind == TokenKind.WHITESPACE:
+                    position = end
+                    continue
+                code = KIND_CODES[kind]
+
+            if code == text_code and kinds and kinds[-1] == text_code:
+                ends[-1] = end  # merged TEXT tokens span from the first to the last part
+            else:
+                line += count_newlines(text, line_position, position)
+                line_position = position
+                kinds.append(code)
+                starts.append(position)
+                ends.append(end)
+                lines.append(line)
+            position = end
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        return Token(KINDS[self.kinds[index]], self.value(index), self.starts[index])
+
+    def __iter__(self):
+        for index in range(len(self.kinds)):
+            yield self[index]
+
+    def value(self, index):
+        kind = KINDS[self.kinds[index]]
+        start, end = self.starts[index], self.ends[index]
+        is_text = isinstance(self.text, str)
+        if kind in (TokenKind.LINK, TokenKind.IMAGE):
+            groups = (PATTERNS if is_text else BYTES_PATTERNS)[kind].match(self.text, start).groups()
+            return groups if is_text else tuple(group.decode() for group in groups)
+        value = self.text[start:end]
+        if kind == TokenKind.TEXT:
+            value = (' ' if is_text else b' ').join(value.split())  # merged TEXT parts are joined with a single space
+        return value if is_text else value.decode()
+
+    def memory_size(self):
+        """Bytes used by the token columns, the text itself is not counted"""
+        return sum(column.itemsize * len(column) for column in (self.kinds, self.starts, self.ends, self.lines))
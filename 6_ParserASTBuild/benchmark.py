@@ -0,0 +1,126 @@
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from main import Parser, lexer, fast_lexer, iter_tokens, markdown_text
+from IncrementalParser import IncrementalParser
+from TokenStore import TokenStore
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000]
+
+
+def make_document(size):
+    repeats = size // len(markdown_text) + 1
+    return (markdown_text * repeats)[:size]
+
+
+def measure(lex, text):
+    start = time.perf_counter()
+    tokens = lex(text)
+    return time.perf_counter() - start, len(tokens)
+
+
+def run(max_size, old_lexer_limit):
+    print(f"{'size':>12} {'lexer':>10} {'tokens':>10} {'seconds':>10} {'ns/byte':>10}")
+    for size in SIZES:
+        if size > max_size:
+            break
+        text = make_document(size)
+        engines = [('fast', fast_lexer)]
+        if size <= old_lexer_limit:  # the old lexer is quadratic, past this point it would run for hours
+            engines.append(('old', lexer))
+        for name, lex in engines:
+            seconds, count = measure(lex, text)
+            print(f"{size:>12} {name:>10} {count:>10} {seconds:>10.4f} {seconds / size * 1e9:>10.1f}")
+
+
+def allocated_bytes(build, text):
+    tracemalloc.start()
+    result = build(text)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, len(result)
+
+
+def run_memory(size):
+    text = make_document(size)
+    print(f"\nmemory for a {size} byte document")
+    print(f"{'storage':>12} {'tokens':>10} {'bytes':>12} {'bytes/token':>12}")
+    for name, build in [('Token list', fast_lexer), ('TokenStore', TokenStore)]:
+        allocated, count = allocated_bytes(build, text)
+        print(f"{name:>12} {count:>10} {allocated:>12} {allocated / count:>12.1f}")
+
+
+def edit_session(document, edits):
+    """Types words at a cursor in the middle of the document, with a backspace every 7 and a new line every 20 edits"""
+    cursor = document.length // 2
+    for index in range(edits):
+        if index % 20 == 19:
+            document.edit(cursor, 0, "\n")
+            cursor += 1
+        elif index % 7 == 6:
+            document.edit(cursor - 1, 1, "")
+            cursor -= 1
+        else:
+            document.edit(cursor, 0, "word "[index % 5])
+            cursor += 1
+
+
+def run_incremental(max_size, edits):
+    print(f"\n{'size':>12} {'segments':>10} {'full parse s':>14} {'us/edit':>10}")
+    for size in SIZES:
+        if size > max_size:
+            break
+        text = make_document(size)
+        start = time.perf_counter()
+        Parser().parse(iter_tokens(text))
+        full_parse = time.perf_counter() - start
+
+        document = IncrementalParser(text)
+        start = time.perf_counter()
+        edit_session(document, edits)
+        per_edit = (time.perf_counter() - start) / edits
+        print(f"{size:>12} {document.count:>10} {full_parse:>14.4f} {per_edit * 1e6:>10.1f}")
+
+
+def run_file(size):
+    with tempfile.NamedTemporaryFile('w', suffix='.md', delete=False, encoding='utf-8') as file:
+        file.write(make_document(size))
+    print(f"\nlexing a {size} byte file")
+    print(f"{'input':>12} {'tokens':>10} {'seconds':>10} {'peak bytes':>12}")
+    try:
+        for name, build in [('read()', lambda path: TokenStore(open(path, encoding='utf-8').read())),
+                            ('mmap', TokenStore.from_file)]:
+            start = time.perf_counter()
+            store = build(file.name)
+            elapsed = time.perf_counter() - start
+            store.close()
+
+            tracemalloc.start()  # separate run, tracing slows everything down
+            build(file.name).close()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{name:>12} {len(store):>10} {elapsed:>10.4f} {peak:>12}")
+    finally:
+        os.remove(file.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare lexer() and fast_lexer() on growing Markdown documents")
+    parser.add_argument('--max-size', type=int, default=SIZES[-1], help="largest input size in bytes")
+    parser.add_argument('--old-lexer-limit', type=int, default=100_000,
+                        help="largest input the quadratic lexer() is run on")
+    parser.add_argument('--memory-size', type=int, default=1_000_000,
+                        help="document size used to compare token storage memory")
+    parser.add_argument('--max-edit-size', type=int, default=10_000_000,
+                        help="largest document size used to time incremental edits")
+    parser.add_argument('--edits', type=int, default=1_000, help="number of incremental edits to time per size")
+    parser.add_argument('--file-size', type=int, default=10_000_000,
+                        help="size of the file used to compare reading and memory-mapping")
+    args = parser.parse_args()
+    run(args.max_size, args.old_lexer_limit)
+    run_memory(args.memory_size)
+    run_file(args.file_size)
+    run_incremental(args.max_edit_size, args.edits)
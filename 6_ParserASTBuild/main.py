@@ -1,6 +1,6 @@
+import io
+import json
 import re
-from typing import List
-from graphviz import Digraph
 
 
 class TokenKind:
@@ -36,8 +36,18 @@ TOKEN_PATTERNS = [
     (TokenKind.TEXT, re.compile(r'^[^\s\[\]#!\*_\(\)-]+')),
 ]
 
+# all patterns joined into one alternation with a named group per kind. alternatives are tried left to right, so the
+# order of TOKEN_PATTERNS is preserved. '^' anchors are dropped because MASTER_PATTERN.match(text, pos) is already
+# anchored at pos, while '^' would only match at the very start of the text
+MASTER_PATTERN = re.compile('|'.join(f'(?P<{kind}>{pattern.pattern.lstrip("^")})' for kind, pattern in TOKEN_PATTERNS))
+
+# for every kind: index of its named group and the number of inner groups (LINK and IMAGE capture text and url)
+GROUP_LAYOUT = {kind: (MASTER_PATTERN.groupindex[kind], pattern.groups) for kind, pattern in TOKEN_PATTERNS}
+
 
 class Token:
+    __slots__ = ('kind', 'value', 'position')
+
     def __init__(self, kind, value, position):
         self.kind = kind
         self.value = value
@@ -73,6 +83,121 @@ def lexer(input_text):
     return tokens
 
 
+def _read_chunks(source, chunk_size):
+    if isinstance(source, str):
+        yield source
+    elif hasattr(source, 'read'):  # file object
+        chunk = source.read(chunk_size)
+        while chunk:
+            yield chunk
+            chunk = source.read(chunk_size)
+    else:  # any iterable of string chunks
+        yield from source
+
+
+# how far iter_tokens reads ahead of a '[' or '![' while looking for the end of a LINK or IMAGE. without a limit an
+# unclosed bracket would keep the rest of the stream in the buffer. once the limit is reached the bracket is taken as
+# BRACKET_OPEN (or OTHER for '!'), the same as lexer() gives for a bracket that isn't closed, so when streaming, links
+# and images longer than this are not recognized
+LOOKAHEAD_LIMIT = 1 << 16
+
+
+def lookahead_end(text, position):
+    """Position right after the last character LINK and IMAGE look at when they are tried at position.
+
+    Both patterns scan forward for the closing ']' and ')', so a link that fails here may still match once
+    more text is appended or the text after position is edited. len(text) + 1 means they ran into the end of the text.
+    """
+    start = position
+    if text[start] == '!':
+        start += 1
+        if start == len(text) or text[start] != '[':
+            return start + 1
+    closing = text.find(']', start + 1)
+    if closing == -1 or closing + 1 == len(text):
+        return len(text) + 1
+    if text[closing + 1] != '(':
+        return closing + 2
+    paren = text.find(')', closing + 2)
+    return len(text) + 1 if paren == -1 else paren + 1
+
+
+def _needs_more_input(text, position, match):
+    """Tells whether the token matched at position could still change if more text was appended"""
+    if match is not None and match.end() == len(text):
+        return True  # a run of characters (or whitespace) may continue in the next chunk
+    return (text[position] in '[!' and len(text) - position < LOOKAHEAD_LIMIT
+            and lookahead_end(text, position) > len(text))
+
+
+def iter_tokens(source, chunk_size=1 << 16, start=0):
+    """Yields the same tokens as lexer() one by one.
+
+    source can be a string, a file object or an iterable of string chunks. Only the unprocessed tail of the input is
+    kept in memory, together with the TEXT token that is still being merged. While looking for the end of a LINK or
+    IMAGE at most LOOKAHEAD_LIMIT characters are read ahead. A string can also be lexed from a start
+    position, token positions stay relative to the whole string.
+    """
+    chunks = _read_chunks(source, chunk_size)
+    match_at = MASTER_PATTERN.match
+    buffer = source if isinstance(source, str) else ''
+    offset = 0  # position of buffer[0] in the whole input
+    position = start if isinstance(source, str) else 0
+    at_eof = isinstance(source, str)  # a whole string needs no lookahead checks
+    pending = None  # last TEXT token, consecutive TEXT tokens are merged into it
+    text_parts = []
+    while True:
+        match = match_at(buffer, position) if position < len(buffer) else None
+        if not at_eof and (position == len(buffer) or _needs_more_input(buffer, position, match)):
+            chunk = next(chunks, None)
+            if chunk is None:
+                at_eof = True
+            else:
+                buffer = buffer[position:] + chunk
+                offset += position
+                position = 0
+            continue
+        if position == len(buffer):
+            break
+
+        if match is None:
+            kind, value, end = TokenKind.OTHER, buffer[position], position + 1
+            print("Can't match token to any pattern")
+        else:
+            kind, end = match.lastgroup, match.end()
+            if kind == TokenKind.WHITESPACE:
+                position = end
+                continue
+            group_index, inner_groups = GROUP_LAYOUT[kind]
+            if inner_groups:
+                value = match.group(*range(group_index + 1, group_index + inner_groups + 1))
+            else:
+                value = match.group(group_index)
+
+        if kind == TokenKind.TEXT and pending is not None:
+            text_parts.append(value)
+        else:
+            if pending is not None:
+                pending.value = ' '.join(text_parts)  # joining once instead of += keeps long runs linear
+                yield pending
+                pending = None
+            if kind == TokenKind.TEXT:
+                pending = Token(kind, value, offset + position)
+                text_parts = [value]
+            else:
+                yield Token(kind, value, offset + position)
+        position = end
+
+    if pending is not None:
+        pending.value = ' '.join(text_parts)
+        yield pending
+
+
+def fast_lexer(input_text):
+    """Produces the same tokens as lexer(), but in a single linear pass over input_text without slicing it"""
+    return list(iter_tokens(input_text))
+
+
 class NodeType:
     ROOT = 'ROOT'
     PARAGRAPH = 'PARAGRAPH'
@@ -85,91 +210,146 @@ class NodeType:
 
 
 class Node:
-    def __init__(self, node_type, node_value, input_tokens: List[Token], children=None):
-        if children is None:
-            children = []
+    __slots__ = ('node_type', 'node_value', 'children')
+
+    def __init__(self, node_type, node_value=None, children=None):
         self.node_type = node_type
         self.node_value = node_value
-        self.children = children
-        self.tokens = input_tokens
-
-        if node_type == NodeType.ROOT:
-            self.__process_paragraphs__()
-        else:
-            self.__process_paragraph_contents__()
-
-    def __process_paragraphs__(self):
-        paragraph_contents = []
-        for token in self.tokens:
-            if token.kind == TokenKind.NEWLINE and len(paragraph_contents) > 0:
-                if paragraph_contents[0].kind == TokenKind.HASH:
-                    node_value = len(paragraph_contents[0].value)
-                    paragraph_contents.pop(0)
-                    self.children.append(Node(NodeType.HEADING, node_value, paragraph_contents))
-                else:
-                    self.children.append(Node(NodeType.PARAGRAPH, None, paragraph_contents))
-                paragraph_contents = []
-
-            if token.kind != TokenKind.NEWLINE:
-                paragraph_contents.append(token)
-
-    def __process_paragraph_contents__(self):
-        emphasized_contents = []
-        star_number = 0  # 0 - not currently parsing any emphasized contents
-        for token in self.tokens:
-            if token.kind == TokenKind.STAR and star_number == 0:
-                star_number = len(token.value)
-                continue
-
-            if star_number != 0 and not (token.kind == TokenKind.STAR and len(token.value) == star_number):
-                emphasized_contents.append(token)
-
-            if star_number == 0:  # we're not inside an emphasized block
-                if token.kind == TokenKind.TEXT:
-                    self.children.append(Node(NodeType.TEXT, token.value, []))
-                elif token.kind == TokenKind.LINK:
-                    link_content_tokens = lexer(token.value[0])
-                    self.children.append(Node(NodeType.LINK, token.value[1], link_content_tokens))
-                elif token.kind == TokenKind.IMAGE:
-                    alttext_content_tokens = lexer(token.value[0])
-                    self.children.append(Node(NodeType.IMAGE, token.value[1], alttext_content_tokens))
-
-            if token.kind == TokenKind.STAR and len(token.value) == star_number:  # if it's a closing star
-                if star_number == 1:
-                    self.children.append(Node(NodeType.ITALIC, None, emphasized_contents))
-                elif star_number == 2:
-                    self.children.append(Node(NodeType.BOLD, None, emphasized_contents))
-                elif star_number == 3:
-                    new_node = Node(NodeType.ITALIC, None, emphasized_contents)
-                    self.children.append(Node(NodeType.BOLD, None, [], children=[new_node]))
-                else:
-                    raise SyntaxError("Incorrect number of stars")
-                emphasized_contents = []
-                star_number = 0
+        self.children = children if children is not None else []
 
     def __str__(self, level=0):
-        ret = "  " * level + f"{self.node_type} {self.node_value if self.node_value else ''}\n"
-        for child in self.children:
-            ret += child.__str__(level+1)
-        return ret
-
-    def visualize(self, graph=None, parent=None):
-        if graph is None:
-            graph = Digraph(node_attr={'shape': 'rectangle', 'fontname': 'Arial'})
-
-        # Create a label for the node based on its type and value
-        node_label = f"{self.node_type}: {self.node_value if self.node_value else ''}"
-        # Each node must have a unique identifier
-        node_id = str(id(self))
-        graph.node(node_id, label=node_label)
-
-        if parent:
-            graph.edge(parent, node_id)
-
-        for child in self.children:
-            child.visualize(graph, node_id)
-
-        return graph
+        lines = []
+        stack = [(self, level)]
+        while stack:
+            node, depth = stack.pop()
+            lines.append("  " * depth + f"{node.node_type} {node.node_value if node.node_value else ''}\n")
+            stack.extend((child, depth + 1) for child in reversed(node.children))
+        return ''.join(lines)
+
+    def visualize(self, collapse_text=False, max_depth=None):
+        """Returns the tree as a graphviz Source, ready to be rendered"""
+        from graphviz import Source  # imported only when something is actually rendered
+        dot = io.StringIO()
+        self.write_dot(dot, collapse_text, max_depth)
+        return Source(dot.getvalue())
+
+    def write_dot(self, stream, collapse_text=False, max_depth=None):
+        """Writes the tree to stream in the DOT language"""
+        stream.write('digraph {\n\tnode [fontname=Arial shape=rectangle]\n')
+        for node_id, parent_id, node_type, node_value in self.__export__(collapse_text, max_depth):
+            label = f"{node_type}: {node_value if node_value else ''}"
+            label = label.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            stream.write(f'\t{node_id} [label="{label}"]\n')
+            if parent_id is not None:
+                stream.write(f'\t{parent_id} -> {node_id}\n')
+        stream.write('}\n')
+
+    def write_json(self, stream, collapse_text=False, max_depth=None):
+        """Writes the tree to stream as {"nodes": [...]}, every node has an id, its parent's id, a type and a value"""
+        stream.write('{"nodes": [')
+        separator = '\n'
+        for node_id, parent_id, node_type, node_value in self.__export__(collapse_text, max_depth):
+            node = {'id': node_id, 'parent': parent_id, 'type': node_type, 'value': node_value}
+            stream.write(separator + json.dumps(node))
+            separator = ',\n'
+        stream.write('\n]}\n')
+
+    def __export__(self, collapse_text, max_depth):
+        """Yields (id, parent id, type, value) for the nodes in pre-order, ids are sequential integers.
+
+        collapse_text merges runs of sibling TEXT nodes into one, nodes deeper than max_depth are left out.
+        """
+        next_id = 0
+        stack = [(self, None, 0)]
+        while stack:
+            node, parent_id, depth = stack.pop()
+            node_id = next_id
+            next_id += 1
+            yield node_id, parent_id, node.node_type, node.node_value
+            if max_depth is not None and depth >= max_depth:
+                continue
+            children = node.children
+            if collapse_text:
+                children = []
+                for child in node.children:
+                    if child.node_type == NodeType.TEXT and children and children[-1].node_type == NodeType.TEXT:
+                        children[-1] = Node(NodeType.TEXT, f"{children[-1].node_value} {child.node_value}")
+                    else:
+                        children.append(child)
+            stack.extend((child, node_id, depth + 1) for child in reversed(children))
+
+
+class Parser:
+    """Builds the AST from a token stream in a single pass.
+
+    Emphasis that is still open is kept on an explicit stack of frames instead of being parsed recursively.
+    A frame is [children, number of stars, failed], where failed means that a SyntaxError has to be raised if the
+    frame ever ends up in the tree (emphasis that is never closed is dropped together with its errors).
+    """
+
+    def __init__(self):
+        self.root = Node(NodeType.ROOT)
+        self.block = None  # heading or paragraph that is being parsed, it's added to root at the next NEWLINE
+        self.frames = []
+
+    def parse(self, tokens):
+        for token in tokens:
+            self.feed(token)
+        return self.root
+
+    def feed(self, token):
+        if token.kind == TokenKind.NEWLINE:
+            if self.block is not None:
+                self.__close_block__()
+            return
+
+        if self.block is None:
+            if token.kind == TokenKind.HASH:
+                self.block = Node(NodeType.HEADING, len(token.value))
+                self.frames = [[self.block.children, 0, False]]
+                return
+            self.block = Node(NodeType.PARAGRAPH)
+            self.frames = [[self.block.children, 0, False]]
+        self.__feed_inline__(self.frames, token)
+
+    def __close_block__(self):
+        if self.frames[0][2]:
+            raise SyntaxError("Incorrect number of stars")
+        self.root.children.append(self.block)
+        self.block = None
+        self.frames = []
+
+    def __feed_inline__(self, frames, token):
+        if token.kind == TokenKind.STAR:
+            stars = len(token.value)
+            for depth in range(1, len(frames)):
+                if frames[depth][1] == stars:
+                    self.__close_emphasis__(frames, depth)
+                    return
+            frames.append([[], stars, False])
+        elif token.kind == TokenKind.TEXT:
+            frames[-1][0].append(Node(NodeType.TEXT, token.value))
+        elif token.kind in (TokenKind.LINK, TokenKind.IMAGE):
+            text, url = token.value
+            node = Node(NodeType.LINK if token.kind == TokenKind.LINK else NodeType.IMAGE, url)
+            # labels can't contain another link or image, so this never goes deeper than one level
+            label_frames = [[node.children, 0, False]]
+            for label_token in iter_tokens(text):
+                self.__feed_inline__(label_frames, label_token)
+            frames[-1][0].append(node)
+            frames[-1][2] = frames[-1][2] or label_frames[0][2]
+
+    def __close_emphasis__(self, frames, depth):
+        children, stars, failed = frames[depth]
+        del frames[depth:]  # emphasis opened inside this one and never closed is dropped
+        parent = frames[-1]
+        parent[2] = parent[2] or failed or stars > 3
+        if stars == 1:
+            parent[0].append(Node(NodeType.ITALIC, None, children))
+        elif stars == 2:
+            parent[0].append(Node(NodeType.BOLD, None, children))
+        elif stars == 3:
+            parent[0].append(Node(NodeType.BOLD, None, [Node(NodeType.ITALIC, None, children)]))
 
 
 markdown_text = """
@@ -183,15 +363,16 @@ just text
 """
 
 
-example_tokens = lexer(markdown_text)
-print("Lexer output:\n")
-for example_token in example_tokens:
-    print(example_token)
+if __name__ == "__main__":
+    example_tokens = lexer(markdown_text)
+    print("Lexer output:\n")
+    for example_token in example_tokens:
+        print(example_token)
 
 
-print("\n===========================\nAST:\n")
-node = Node(NodeType.ROOT, None, example_tokens)
-print(node)
+    print("\n===========================\nAST:\n")
+    node = Parser().parse(example_tokens)
+    print(node)
 
-graph = node.visualize()
-graph.render('output', view=True)
+    graph = node.visualize()
+    graph.render('output', view=True)
@@ -0,0 +1,98 @@
+import io
+import random
+import unittest
+from contextlib import redirect_stdout
+import IncrementalParser as incremental
+from IncrementalParser import IncrementalParser
+import main
+from main import Parser, TokenKind, iter_tokens, markdown_text
+
+
+def full_parse(text):
+    with redirect_stdout(io.StringIO()):
+        return str(Parser().parse(iter_tokens(text)))
+
+
+class TestIncrementalParser(unittest.TestCase):
+
+    def setUp(self):
+        self.block_size = incremental.BLOCK_SIZE
+        incremental.BLOCK_SIZE = 2  # many small blocks, so edits cross and split them
+
+    def tearDown(self):
+        incremental.BLOCK_SIZE = self.block_size
+
+    def check_edits(self, text, edits):
+        document = IncrementalParser(text)
+        for offset, deleted, inserted in edits:
+            text = text[:offset] + inserted + text[offset + deleted:]
+            self.assertEqual(str(document.edit(offset, deleted, inserted)), full_parse(text))
+            self.assertEqual(document.text, text)
+            self.assertEqual(document.length, len(text))
+        return document
+
+    def test_typing(self):
+        middle = len(markdown_text) // 2
+        self.check_edits(markdown_text * 4, [(middle + index, 0, "x") for index in range(20)])
+
+    def test_new_lines_and_merges(self):
+        text = markdown_text * 4
+        document = self.check_edits(text, [(30, 0, "\n\n"), (31, 1, ""), (10, 200, ""), (0, 0, "# a\nb\n")])
+        self.assertEqual(len(document.root.children), len(Parser().parse(iter_tokens(document.text)).children))
+
+    def test_link_closed_later(self):
+        # the first paragraph looks ahead for the closing part of the link, so it changes with the later edit
+        text = "see [a link\n\nmore text\n\nend\n"
+        self.check_edits(text, [(text.index("more"), 0, "](http://example.com) ")])
+
+    def test_random_edits(self):
+        rng = random.Random(0)
+        pieces = list(" \n#*_-[]()!ab") + ["**", "[l](u)", "\n\n", "word "]
+        text = markdown_text * 3
+        edits = []
+        for _ in range(200):
+            offset = rng.randint(0, len(text))
+            deleted = rng.randint(0, min(5, len(text) - offset))
+            inserted = ''.join(rng.choice(pieces) for _ in range(rng.randint(0, 3)))
+            candidate = text[:offset] + inserted + text[offset + deleted:]
+            try:
+                full_parse(candidate)
+            except SyntaxError:
+                continue
+            edits.append((offset, deleted, inserted))
+            text = candidate
+        self.check_edits(markdown_text * 3, edits)
+
+    def test_syntax_error_keeps_document(self):
+        document = IncrementalParser(markdown_text)
+        before = str(document.root)
+        with self.assertRaises(SyntaxError):
+            document.edit(len(markdown_text) - 1, 0, "\n****a**** b\n")
+        self.assertEqual(str(document.root), before)
+        self.assertEqual(document.text, markdown_text)
+
+
+class TestIterTokens(unittest.TestCase):
+
+    def stream(self, text, chunk_size, read):
+        for start in range(0, len(text), chunk_size):
+            read.append(start + chunk_size)
+            yield text[start:start + chunk_size]
+
+    def test_unclosed_bracket_stream(self):
+        for opening, kind in (("[", TokenKind.BRACKET_OPEN), ("![", TokenKind.OTHER)):
+            text = "a " + opening + "word " * 100000 + "] (end)\n"
+            read = []
+            with redirect_stdout(io.StringIO()):
+                tokens = iter_tokens(self.stream(text, 1000, read))
+                next(tokens)
+                self.assertEqual(next(tokens).kind, kind)
+                # the bracket is given up once the lookahead limit is reached, not at the end of the input
+                self.assertLessEqual(read[-1], main.LOOKAHEAD_LIMIT + 2000)
+                streamed = [(token.kind, token.value, token.position) for token in tokens]
+                whole = [(token.kind, token.value, token.position) for token in iter_tokens(text)][2:]
+            self.assertEqual(streamed, whole)
+
+
+if __name__ == '__main__':
+    unittest.main()
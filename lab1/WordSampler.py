@@ -0,0 +1,95 @@
+import random
+
+from lab1 import Grammar
+
+
+class WordSampler:
+    """Draws words of a given length (or range of lengths) from a grammar, uniformly among all of them.
+
+    counts[nonterminal][n] is the number of words of n terminals the nonterminal derives, filled in by length as
+    longer words are asked for. A word is then built left to right, picking each production in proportion to the
+    number of words it can still lead to, so a sample takes O(length) steps. With weights, {nonterminal: [weight of
+    each production]}, a word is drawn with a chance proportional to the product of the weights of its productions.
+    """
+
+    def __init__(self, grammar=None, weights=None, seed=None):
+        self.grammar = grammar or Grammar()
+        self.rules = self.grammar.split_productions()
+        for nonterminal, choices in self.rules.items():
+            if any(not terminals for terminals, _ in choices):
+                raise ValueError(f"every production of {nonterminal} has to start with a terminal")
+        self.weights = {nonterminal: (weights or {}).get(nonterminal, [1] * len(choices))
+                        for nonterminal, choices in self.rules.items()}
+        self.start = self.grammar.VN[0]
+        self.counts = {nonterminal: [0] for nonterminal in self.rules}  # no word is empty
+        self.rng = random.Random(seed)
+
+    def count(self, length):
+        """Number of words of the given length, weighted when there are weights"""
+        self.__extend__(length)
+        return self.counts[self.start][length]
+
+    def sample(self, length):
+        """A random word of the given length, None if there's none"""
+        self.__extend__(length)
+        if not self.counts[self.start][length]:
+            return None
+        word = []
+        nonterminal = self.start
+        remaining = length
+        while nonterminal is not None:
+            options = [(weight * self.__words__(terminals, following, remaining), terminals, following)
+                       for weight, (terminals, following) in zip(self.weights[nonterminal], self.rules[nonterminal])]
+            terminals, nonterminal = self.__pick__(options)
+            word.append(terminals)
+            remaining -= len(terminals)
+        return ''.join(word)
+
+    def sample_range(self, min_length, max_length):
+        """A random word with min_length to max_length terminals, every word in the range equally likely"""
+        self.__extend__(max_length)
+        options = [(self.counts[self.start][length], length, None) for length in range(min_length, max_length + 1)]
+        if not any(total for total, _, _ in options):
+            return None
+        return self.sample(self.__pick__(options)[0])
+
+    def samples(self, number, min_length, max_length=None):
+        """Yields number words, see sample_range"""
+        for _ in range(number):
+            yield self.sample_range(min_length, min_length if max_length is None else max_length)
+
+    def __words__(self, terminals, following, remaining):
+        if following is None:
+            return 1 if len(terminals) == remaining else 0
+        rest = remaining - len(terminals)
+        return self.counts[following][rest] if rest > 0 else 0
+
+    def __pick__(self, options):
+        """Picks (value, extra) of one of the (weight, value, extra) options with a chance proportional to weight"""
+        total = sum(weight for weight, _, _ in options)
+        pick = self.rng.randrange(total) if isinstance(total, int) else self.rng.random() * total
+        for weight, value, extra in options:
+            pick -= weight
+            if pick < 0:
+                return value, extra
+        # float rounding left a tiny rest, an option without weight can't lead to a word of the right length
+        _, value, extra = next(option for option in reversed(options) if option[0] > 0)
+        return value, extra
+
+    def __extend__(self, length):
+        for size in range(len(self.counts[self.start]), length + 1):
+            for nonterminal in self.rules:
+                self.counts[nonterminal].append(0)
+            # every production has a terminal, so words of this size only use counts of shorter ones
+            for nonterminal, choices in self.rules.items():
+                self.counts[nonterminal][size] = sum(weight * self.__words__(terminals, following, size)
+                                                     for weight, (terminals, following)
+                                                     in zip(self.weights[nonterminal], choices))
+
+
+if __name__ == "__main__":
+    sampler = WordSampler(seed=1)
+    for length in (2, 5, 10, 50):
+        print(length, sampler.count(length), sampler.sample(length))
+    print(list(sampler.samples(5, 20, 30)))
+    print(list(WordSampler(weights={'S': [10, 1, 1]}, seed=1).samples(5, 6, 12)))
@@ -11,20 +11,103 @@ class Grammar:
             'R': ['bR', 'f']
         }
 
+    def split_productions(self):
+        """{nonterminal: [(terminals, next nonterminal or None), ...]}, for 'aS' that's ('a', 'S')"""
+        return {nonterminal: [(production[:-1], production[-1]) if production[-1] in self.VN else (production, None)
+                              for production in productions]
+                for nonterminal, productions in self.P.items()}
 
-def print_strings(number_of_strings, showProgress):
-    grammar = Grammar()
 
-    for i in range(number_of_strings):
-        tmp = "S"
-        start = grammar.VN[0]
-        while start[-1] not in grammar.VT:
-            t = start[-1]
-            start = start[:-1] + random.choice(grammar.P[t])
-            tmp += f" -> {start}"
-        print(start)
-        if (showProgress): print(tmp + "\n")
+def iter_strings(number_of_strings, trace=False, seed=None, grammar=None):
+    """Yields number_of_strings random words, or (word, derivation) pairs with trace.
+
+    The word is collected in a list, one production at a time, instead of re-slicing the whole string at every step.
+    """
+    grammar = grammar or Grammar()
+    rules = grammar.split_productions()
+    rng = random.Random(seed)
+    start = grammar.VN[0]
+
+    for _ in range(number_of_strings):
+        word = []
+        nonterminal = start
+        steps = [start]
+        while nonterminal is not None:
+            terminals, nonterminal = rng.choice(rules[nonterminal])
+            word.append(terminals)
+            if trace:
+                steps.append(''.join(word) + (nonterminal or ''))
+        if trace:
+            yield ''.join(word), ' -> '.join(steps)
+        else:
+            yield ''.join(word)
+
+
+def batch_strings(number_of_strings, seed=None, grammar=None):
+    """Random words like iter_strings, made with numpy for all of them at once.
+
+    The words follow the same distribution as the ones of iter_strings, but a seed gives different words than the
+    same seed there. Every derivation is a row. At each step a random production is picked for all unfinished rows
+    together through a (nonterminal, choice) table, and only those rows are kept for the step. The terminal bytes are
+    written into one buffer at the end, where every word already has its place. Terminals have to be single ASCII
+    characters.
+    """
+    import numpy as np
 
+    grammar = grammar or Grammar()
+    rules = grammar.split_productions()
+    nonterminals = list(rules)
+    codes = {nonterminal: code for code, nonterminal in enumerate(nonterminals)}
+    done = len(nonterminals)  # state of finished rows
+    width = max(len(terminals) for choices in rules.values() for terminals, _ in choices)
+    choice_counts = np.array([len(rules[nonterminal]) for nonterminal in nonterminals])
+    most = int(choice_counts.max())
+
+    # next_state[state, choice], emitted[state, choice] = terminal bytes and emitted_lengths[state, choice]
+    next_state = np.full((done, most), done, dtype=np.int64)
+    emitted = np.zeros((done, most, width), dtype=np.uint8)
+    emitted_lengths = np.zeros((done, most), dtype=np.int64)
+    for nonterminal, choices in rules.items():
+        for choice, (terminals, following) in enumerate(choices):
+            next_state[codes[nonterminal], choice] = done if following is None else codes[following]
+            emitted[codes[nonterminal], choice, :len(terminals)] = list(terminals.encode('ascii'))
+            emitted_lengths[codes[nonterminal], choice] = len(terminals)
+
+    rng = np.random.default_rng(seed)
+    active = np.arange(number_of_strings)
+    states = np.full(number_of_strings, codes[grammar.VN[0]], dtype=np.int64)  # of the active rows
+    lengths = np.zeros(number_of_strings, dtype=np.int64)
+    steps = []  # (active rows, their states, their choices)
+    while active.size:
+        choices = (rng.random(active.size) * choice_counts[states]).astype(np.int64)
+        steps.append((active, states, choices))
+        lengths[active] += emitted_lengths[states, choices]
+        states = next_state[states, choices]
+        unfinished = states != done
+        active, states = active[unfinished], states[unfinished]
+
+    # every word gets its place in one buffer and ends with a newline, so all words decode in one go
+    starts = np.cumsum(lengths + 1) - lengths - 1
+    buffer = np.full(int(lengths.sum()) + number_of_strings, ord('\n'), dtype=np.uint8)
+    for rows, step_states, step_choices in steps:
+        step_lengths = emitted_lengths[step_states, step_choices]
+        step_bytes = emitted[step_states, step_choices]
+        for column in range(width):
+            writing = step_lengths > column
+            buffer[starts[rows[writing]] + column] = step_bytes[writing, column]
+        starts[rows] += step_lengths
+    return buffer.tobytes().decode('ascii').split('\n')[:-1]
+
+
+def print_strings(number_of_strings, showProgress):
+    for word in iter_strings(number_of_strings, trace=showProgress):
+        if showProgress:
+            word, derivation = word
+            print(word)
+            print(derivation + "\n")
+        else:
+            print(word)
 
 
-print_strings(5, True)
+if __name__ == "__main__":
+    print_strings(5, True)
@@ -0,0 +1,63 @@
+import random
+import unittest
+from lab1 import Grammar, iter_strings, batch_strings
+from WordSampler import WordSampler
+
+
+def generates(word, grammar=None):
+    """Whether the right-linear grammar derives word"""
+    grammar = grammar or Grammar()
+    rules = grammar.split_productions()
+    current = {(grammar.VN[0], 0)}
+    while current:
+        following = set()
+        for nonterminal, position in current:
+            for terminals, next_nonterminal in rules[nonterminal]:
+                if not word.startswith(terminals, position):
+                    continue
+                if next_nonterminal is None:
+                    if position + len(terminals) == len(word):
+                        return True
+                else:
+                    following.add((next_nonterminal, position + len(terminals)))
+        current = following
+    return False
+
+
+class HighestPick(random.Random):
+    """Always draws the top of the range, where float rounding leaves a rest after the last option"""
+
+    def random(self):
+        return 1.0
+
+
+class TestWordSampler(unittest.TestCase):
+
+    def test_lengths(self):
+        sampler = WordSampler(seed=0)
+        for length in range(2, 30):
+            word = sampler.sample(length)
+            self.assertEqual(len(word), length)
+            self.assertTrue(generates(word))
+
+    def test_float_rounding_skips_options_without_weight(self):
+        sampler = WordSampler(weights={'S': [0.1, 0.2, 0.3], 'D': [0.1, 0.2, 0.3], 'R': [0.1, 0.7]})
+        sampler.rng = HighestPick()
+        for length in range(2, 12):
+            word = sampler.sample(length)
+            self.assertEqual(len(word), length)
+            self.assertTrue(generates(word))
+
+    def test_iter_strings(self):
+        for word in iter_strings(200, seed=0):
+            self.assertTrue(generates(word))
+
+    def test_batch_strings(self):
+        words = batch_strings(2000, seed=0)
+        self.assertEqual(len(words), 2000)
+        self.assertTrue(all(generates(word) for word in words))
+        self.assertEqual(batch_strings(0), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import numpy as np
+
+from FiniteAutomaton import FiniteAutomaton
+
+
+class BatchMatcher:
+    """Runs a FiniteAutomaton on many words at once with numpy.
+
+    Words are encoded as rows of symbol indexes, padded to the longest word. Besides the symbols of E there are two
+    more columns: padding, which keeps every state where it is, and unknown symbols, which go to a dead state.
+    For a DFA every step is one lookup in a dense (state, symbol) matrix for all words together. For an NFA every
+    word has a boolean vector of current states, and a step multiplies the vectors of all words reading a symbol
+    by that symbol's boolean transition matrix.
+    """
+
+    def __init__(self, automaton, chunk_size=1 << 16):
+        self.automaton = automaton
+        self.chunk_size = chunk_size
+        self.symbols = {symbol: index for index, symbol in enumerate(automaton.E)}
+        self.padding = len(automaton.E)
+        self.unknown = len(automaton.E) + 1
+        states = {state: index for index, state in enumerate(automaton.Q)}
+        self.dead = len(automaton.Q)
+        self.start = states[automaton.q0]
+        self.final = np.zeros(len(automaton.Q) + 1, dtype=bool)
+        self.final[[states[state] for state in automaton.F]] = True
+
+        # single-character symbols can be encoded straight from the bytes of the words
+        self.byte_codes = None
+        if all(len(symbol) == 1 and ord(symbol) < 256 for symbol in automaton.E):
+            self.byte_codes = np.full(256, self.unknown, dtype=np.uint8 if self.unknown < 256 else np.int32)
+            for symbol, index in self.symbols.items():
+                self.byte_codes[ord(symbol)] = index
+
+        self.deterministic = automaton.is_deterministic()
+        size = len(automaton.Q) + 1
+        if self.deterministic:
+            self.matrix = np.full((size, len(automaton.E) + 2), self.dead, dtype=np.int32)
+            self.matrix[:, self.padding] = np.arange(size)
+            for state, transitions in automaton.sigma.items():
+                for symbol, next_state in transitions:
+                    self.matrix[states[state], self.symbols[symbol]] = states[next_state]
+        else:
+            # matrices[symbol][state, next state], the dead state is simply the empty set here
+            # bool matmul is an OR of ANDs, so any number of paths into a state can't overflow
+            self.matrices = np.zeros((len(automaton.E) + 2, size, size), dtype=bool)
+            self.matrices[self.padding] = np.eye(size, dtype=bool)
+            for state, transitions in automaton.sigma.items():
+                for symbol, next_state in transitions:
+                    self.matrices[self.symbols[symbol], states[state], states[next_state]] = True
+
+    def encode(self, words):
+        """The (words, longest word) matrix of symbol indexes"""
+        lengths = np.fromiter((len(word) for word in words), dtype=np.int64, count=len(words))
+        width = int(lengths.max()) if len(words) else 0
+        codes = np.full((len(words), width), self.padding, dtype=np.int32)
+        if not width:
+            return codes
+        if self.byte_codes is not None and all(isinstance(word, str) for word in words):
+            try:
+                flat = np.frombuffer(''.join(words).encode('latin-1'), dtype=np.uint8)
+            except UnicodeEncodeError:
+                flat = None  # a character that can't be a symbol, take the slow way
+            if flat is not None:
+                rows = np.repeat(np.arange(len(words)), lengths)
+                columns = np.arange(len(flat)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+                codes[rows, columns] = self.byte_codes[flat]
+                return codes
+        for row, word in enumerate(words):
+            codes[row, :len(word)] = [self.symbols.get(symbol, self.unknown) for symbol in word]
+        return codes
+
+    def accepts(self, words):
+        """Boolean array, for every word whether the automaton accepts it"""
+        result = np.zeros(len(words), dtype=bool)
+        for begin in range(0, len(words), self.chunk_size):
+            codes = self.encode(words[begin:begin + self.chunk_size])
+            if self.deterministic:
+                result[begin:begin + len(codes)] = self.__run_dfa__(codes)
+            else:
+                result[begin:begin + len(codes)] = self.__run_nfa__(codes)
+        return result
+
+    def __run_dfa__(self, codes):
+        states = np.full(len(codes), self.start, dtype=np.int32)
+        for column in codes.T:
+            states = self.matrix[states, column]
+        return self.final[states]
+
+    def __run_nfa__(self, codes):
+        current = np.zeros((len(codes), self.dead + 1), dtype=bool)
+        current[:, self.start] = True
+        for column in codes.T:
+            following = np.zeros_like(current)
+            for symbol in np.unique(column):
+                if symbol == self.unknown:
+                    continue  # no next states
+                rows = column == symbol
+                following[rows] = current[rows] @ self.matrices[symbol]
+            current = following
+        return current[:, self.final].any(axis=1)
+
+
+if __name__ == "__main__":
+    import time
+
+    automaton = FiniteAutomaton()
+    rng = np.random.default_rng(0)
+    words = [''.join(word) for word in rng.choice(['a', 'b'], size=(1_000_000, 8))]
+    for name, matcher in [('NFA', BatchMatcher(automaton)), ('DFA', BatchMatcher(automaton.to_dfa().minimize()))]:
+        start = time.perf_counter()
+        accepted = matcher.accepts(words)
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {accepted.sum()} of {len(words)} accepted, {len(words) / elapsed:,.0f} words/s")
@@ -1,3 +1,5 @@
+from array import array
+
 from Grammar import Grammar
 
 class FiniteAutomaton:
@@ -12,16 +14,244 @@ class FiniteAutomaton:
     #         'q3': [['b', 'q4'], ['a', 'q1']]
     #     }
 
-    def __init__(self):
-        self.Q = ['0', '1', '2', '3', '4']  # I replaced 'qX' strings with just 'X' because of Grammar class incorrectly
-        self.E = ['a', 'b']                 # handling strings that are longer than 1 character
-        self.F = ['4']
-        self.sigma = {
+    def __init__(self, Q=None, E=None, F=None, sigma=None, q0=None):
+        # I replaced 'qX' strings with just 'X' because of Grammar class incorrectly
+        # handling strings that are longer than 1 character
+        self.Q = Q if Q is not None else ['0', '1', '2', '3', '4']
+        self.E = E if E is not None else ['a', 'b']
+        self.F = F if F is not None else ['4']
+        self.sigma = sigma if sigma is not None else {
             '0': [['a', '1']],
             '1': [['b', '1'], ['a', '2']],
             '2': [['b', '2'], ['b', '3']],
             '3': [['b', '4'], ['a', '1']]
         }
+        self.q0 = q0 if q0 is not None else self.Q[0]
+        # for DFAs made by to_dfa(): table[state * len(E) + symbol] is the next state index or -1, where
+        # states and symbols are indexes into Q and E. sigma is filled in too, so both can be used
+        self.table = None
+        self.moves = None  # {state: {symbol: [next states]}}, built from sigma by the first accepts() call
+        self.lookup = None  # (symbol indexes, start index, final flags) for the table, also built by accepts()
+
+    @classmethod
+    def from_table(cls, table, E, final_states, start=0):
+        """A DFA with states named '0', '1', ... from a flat transition table, see self.table"""
+        count = len(table) // len(E)
+        Q = [str(state) for state in range(count)]
+        sigma = {}
+        for state in range(count):
+            row = table[state * len(E):(state + 1) * len(E)]
+            sigma[Q[state]] = [[symbol, Q[target]] for symbol, target in zip(E, row) if target >= 0]
+        automaton = cls(Q, list(E), [Q[state] for state in sorted(final_states)], sigma, Q[start])
+        automaton.table = table
+        return automaton
+
+    def accepts(self, word):
+        """word is a string of one-character symbols or a list of symbols"""
+        if self.table is not None:
+            if self.lookup is None:
+                indexes = {state: position for position, state in enumerate(self.Q)}
+                final = bytearray(len(self.Q))
+                for state in self.F:
+                    final[indexes[state]] = 1
+                self.lookup = ({symbol: position for position, symbol in enumerate(self.E)}, indexes[self.q0], final)
+            symbols, state, final = self.lookup
+            table, width = self.table, len(self.E)
+            for symbol in word:
+                position = symbols.get(symbol)
+                if position is None:
+                    return False
+                state = table[state * width + position]
+                if state < 0:
+                    return False
+            return bool(final[state])
+
+        if self.moves is None:
+            self.moves = {}
+            for state, transitions in self.sigma.items():
+                for symbol, next_state in transitions:
+                    self.moves.setdefault(state, {}).setdefault(symbol, []).append(next_state)
+        current = {self.q0}
+        for symbol in word:
+            current = {next_state for state in current for next_state in self.moves.get(state, {}).get(symbol, ())}
+            if not current:
+                return False
+        return any(state in current for state in self.F)
+
+    def to_dfa(self):
+        """Subset construction, returns an equivalent DFA.
+
+        Sets of states are bitmasks over Q. For every symbol the targets of all states are precomputed, 8 states
+        at a time: moves[symbol][chunk][byte] is the union of the targets of the states in that byte of the mask.
+        Only the subsets reachable from the start state are ever built, the empty set becomes a missing transition.
+        """
+        index = {state: position for position, state in enumerate(self.Q)}
+        symbols = {symbol: position for position, symbol in enumerate(self.E)}
+        targets = [[0] * len(self.Q) for _ in self.E]  # targets[symbol][state] = mask of the next states
+        for state, transitions in self.sigma.items():
+            for symbol, next_state in transitions:
+                targets[symbols[symbol]][index[state]] |= 1 << index[next_state]
+
+        chunks = (len(self.Q) + 7) // 8
+        moves = []
+        for symbol_targets in targets:
+            symbol_moves = []
+            for chunk in range(chunks):
+                byte_moves = [0] * 256
+                for byte in range(1, 256):
+                    lowest = byte & -byte
+                    state = chunk * 8 + lowest.bit_length() - 1
+                    byte_moves[byte] = byte_moves[byte ^ lowest] | (symbol_targets[state] if state < len(self.Q) else 0)
+                symbol_moves.append(byte_moves)
+            moves.append(symbol_moves)
+
+        final_mask = 0
+        for state in self.F:
+            final_mask |= 1 << index[state]
+
+        start = 1 << index[self.q0]
+        subsets = {start: 0}  # mask -> DFA state
+        order = [start]
+        table = array('i')
+        final_states = []
+        for mask in order:  # grows while new subsets are found
+            if mask & final_mask:
+                final_states.append(subsets[mask])
+            for symbol_moves in moves:
+                next_mask = 0
+                remaining = mask
+                chunk = 0
+                while remaining:
+                    if remaining & 0xFF:
+                        next_mask |= symbol_moves[chunk][remaining & 0xFF]
+                    remaining >>= 8
+                    chunk += 1
+                if not next_mask:
+                    table.append(-1)
+                    continue
+                if next_mask not in subsets:
+                    subsets[next_mask] = len(order)
+                    order.append(next_mask)
+                table.append(subsets[next_mask])
+        return FiniteAutomaton.from_table(table, self.E, final_states)
+
+    def minimize(self):
+        """Hopcroft's algorithm, returns the minimal DFA for the same language in O(n k log n).
+
+        Works on the transition table (NFAs and automata without one go through to_dfa() first). Unreachable states
+        are dropped, and missing transitions go to an added dead state. States that can't reach an accepting state
+        end up in its block and are left out of the result, as missing transitions again.
+        The partition lives in flat lists: elements holds the states block after block, block b owns
+        elements[first[b]:past[b]], and the states of a block that a splitter reaches are moved to its front.
+        """
+        dfa = self if self.table is not None else self.to_dfa()
+        k = len(dfa.E)
+        table = dfa.table
+        finals = {int(state) for state in dfa.F}
+        start = int(dfa.q0)
+
+        # keep the reachable states only
+        number = {start: 0}
+        states = [start]
+        for state in states:
+            for target in table[state * k:(state + 1) * k]:
+                if target >= 0 and target not in number:
+                    number[target] = len(states)
+                    states.append(target)
+        delta = [number[target] if target >= 0 else -1
+                 for state in states for target in table[state * k:(state + 1) * k]]
+        # the dead state is always added, every state that ends up in its block is left out of the result
+        dead = len(states)
+        n = dead + 1
+        delta = [target if target >= 0 else dead for target in delta] + [dead] * k
+        accepting = [state in finals for state in states] + [False] * (n - len(states))
+
+        # predecessors of every state for every symbol, as one flat list per symbol with offsets
+        inverse = []
+        for symbol in range(k):
+            offsets = [0] * (n + 1)
+            for state in range(n):
+                offsets[delta[state * k + symbol] + 1] += 1
+            for state in range(n):
+                offsets[state + 1] += offsets[state]
+            sources = [0] * n
+            filled = offsets[:-1]
+            for state in range(n):
+                target = delta[state * k + symbol]
+                sources[filled[target]] = state
+                filled[target] += 1
+            inverse.append((offsets, sources))
+
+        # starting partition: accepting and the other states
+        elements = [state for state in range(n) if accepting[state]] + [state for state in range(n)
+                                                                         if not accepting[state]]
+        position = [0] * n
+        for index, state in enumerate(elements):
+            position[state] = index
+        split = sum(accepting)
+        first, past = [0], [n]
+        block = [0] * n
+        worklist = []
+        if 0 < split < n:
+            first, past = [0, split], [split, n]
+            for state in elements[split:]:
+                block[state] = 1
+            worklist.append(0 if split <= n - split else 1)
+        marked = [0] * len(first)
+
+        while worklist:
+            splitter = elements[first[worklist[-1]]:past[worklist.pop()]]
+            for offsets, sources in inverse:
+                touched = []
+                for target in splitter:
+                    for source in sources[offsets[target]:offsets[target + 1]]:
+                        current = block[source]
+                        if not marked[current]:
+                            touched.append(current)
+                        # move source to the marked front of its block
+                        here, front = position[source], first[current] + marked[current]
+                        other = elements[front]
+                        elements[front], elements[here] = source, other
+                        position[source], position[other] = front, here
+                        marked[current] += 1
+                for current in touched:
+                    count, marked[current] = marked[current], 0
+                    size = past[current] - first[current]
+                    if count == size:
+                        continue
+                    # the smaller part becomes the new block, only its states get relabeled
+                    new = len(first)
+                    if count <= size - count:
+                        first.append(first[current])
+                        past.append(first[current] + count)
+                        first[current] += count
+                    else:
+                        first.append(first[current] + count)
+                        past.append(past[current])
+                        past[current] = first[current] + count
+                    marked.append(0)
+                    for index in range(first[new], past[new]):
+                        block[elements[index]] = new
+                    worklist.append(new)
+
+        # number the blocks in the order they are reached from the start, without the dead one
+        dead_block = block[dead]
+        numbers = {block[0]: 0}
+        order = [block[0]]
+        result = array('i')
+        for current in order:
+            state = elements[first[current]]
+            for target in delta[state * k:(state + 1) * k]:
+                target_block = block[target]
+                if target_block == dead_block:
+                    result.append(-1)
+                    continue
+                if target_block not in numbers:
+                    numbers[target_block] = len(order)
+                    order.append(target_block)
+                result.append(numbers[target_block])
+        final_states = [numbers[current] for current in order if accepting[elements[first[current]]]]
+        return FiniteAutomaton.from_table(result, dfa.E, final_states)
 
     def convert_to_grammar(self):
         VN = self.Q
@@ -0,0 +1,47 @@
+import argparse
+import random
+import time
+from array import array
+
+from FiniteAutomaton import FiniteAutomaton
+
+SIZES = [1_000, 10_000, 100_000]
+
+
+def random_dfa(states, symbols, rng, copies=1):
+    """A complete random DFA with states // copies distinct states, each one repeated copies times.
+
+    A copy of a state moves to a random copy of the original target, so the minimal DFA has at most
+    states // copies states.
+    """
+    base = max(1, states // copies)
+    alphabet = [chr(ord('a') + symbol) for symbol in range(symbols)]
+    targets = [rng.randrange(base) for _ in range(base * symbols)]
+    finals = {state for state in range(base) if rng.random() < 0.5}
+    table = array('i', (targets[(state % base) * symbols + symbol] + base * rng.randrange(copies)
+                        for state in range(base * copies) for symbol in range(symbols)))
+    return FiniteAutomaton.from_table(table, alphabet, [state for state in range(base * copies)
+                                                        if state % base in finals])
+
+
+def run(max_size, symbols, seed):
+    rng = random.Random(seed)
+    print(f"{'states':>10} {'copies':>8} {'symbols':>8} {'minimal':>10} {'seconds':>10}")
+    for size in SIZES:
+        if size > max_size:
+            break
+        for copies in (1, 4):
+            dfa = random_dfa(size, symbols, rng, copies)
+            start = time.perf_counter()
+            minimal = dfa.minimize()
+            elapsed = time.perf_counter() - start
+            print(f"{len(dfa.Q):>10} {copies:>8} {symbols:>8} {len(minimal.Q):>10} {elapsed:>10.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time FiniteAutomaton.minimize() on random DFAs")
+    parser.add_argument('--max-size', type=int, default=SIZES[-1], help="largest number of states")
+    parser.add_argument('--symbols', type=int, default=2, help="alphabet size")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    run(args.max_size, args.symbols, args.seed)
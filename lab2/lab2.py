@@ -7,3 +7,15 @@ g = fa.convert_to_grammar()
 g.print1()
 print(g.classify())
 print(fa.is_deterministic())
+
+dfa = fa.to_dfa()
+print(dfa.sigma)
+print(dfa.F)
+print(dfa.is_deterministic())
+
+minimal = fa.minimize()
+print(minimal.sigma)
+print(minimal.F)
+
+for word in ['abab', 'abbb', 'aabbb']:
+    print(word, fa.accepts(word), minimal.accepts(word))
@@ -0,0 +1,61 @@
+import random
+import unittest
+from FiniteAutomaton import FiniteAutomaton
+from BatchMatcher import BatchMatcher
+
+
+def fan_automaton(width):
+    """s -a-> q0 ... q(width - 1), each qi -a-> t, t final: width paths lead to t on 'aa'"""
+    middle = [f"q{index}" for index in range(width)]
+    sigma = {'s': [['a', state] for state in middle]}
+    for state in middle:
+        sigma[state] = [['a', 't']]
+    return FiniteAutomaton(['s'] + middle + ['t'], ['a'], ['t'], sigma, 's')
+
+
+class TestBatchMatcher(unittest.TestCase):
+
+    def test_many_paths_into_one_state(self):
+        automaton = fan_automaton(256)
+        self.assertTrue(automaton.accepts('aa'))
+        self.assertEqual(list(BatchMatcher(automaton.to_dfa()).accepts(['aa'])), [True])
+        self.assertEqual(list(BatchMatcher(automaton).accepts(['aa', 'a', 'aaa'])), [True, False, False])
+
+    def test_same_as_accepts(self):
+        automaton = FiniteAutomaton()
+        rng = random.Random(0)
+        words = [''.join(rng.choice('abc') for _ in range(rng.randint(0, 8))) for _ in range(500)]
+        expected = [automaton.accepts(word) for word in words]
+        for target in (automaton, automaton.to_dfa(), automaton.to_dfa().minimize()):
+            matcher = BatchMatcher(target)
+            self.assertEqual(list(matcher.accepts(words)), expected)
+
+
+class TestAccepts(unittest.TestCase):
+
+    def test_table_and_sigma_agree(self):
+        automaton = FiniteAutomaton()
+        dfa = automaton.to_dfa()
+        minimal = dfa.minimize()
+        rng = random.Random(1)
+        for _ in range(500):
+            word = ''.join(rng.choice('ab') for _ in range(rng.randint(0, 10)))
+            self.assertEqual(dfa.accepts(word), automaton.accepts(word))
+            self.assertEqual(minimal.accepts(word), automaton.accepts(word))
+
+    def test_table_lookup_is_reused(self):
+        dfa = FiniteAutomaton().to_dfa()
+        self.assertIsNone(dfa.lookup)
+        self.assertTrue(dfa.accepts('aabb'))
+        lookup = dfa.lookup
+        self.assertFalse(dfa.accepts('ab'))
+        self.assertIs(dfa.lookup, lookup)
+
+    def test_unknown_symbol(self):
+        dfa = FiniteAutomaton().to_dfa()
+        self.assertFalse(dfa.accepts('abxb'))
+        self.assertFalse(FiniteAutomaton().accepts('abxb'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from lab3 import Lexer, TokenStore, markdown_input
+
+
+def make_document(size):
+    repeats = size // len(markdown_input) + 1
+    return ((markdown_input + "\n") * repeats)[:size]
+
+
+def lex_to_list(text, table_driven=False):
+    lexer = Lexer(text)
+    lexer.lex(table_driven)
+    return lexer.tokens
+
+
+def run_dispatch(size, repeat):
+    text = make_document(size)
+    print(f"lexing a {size} byte document, best of {repeat}")
+    print(f"{'mode':>12} {'tokens':>10} {'seconds':>10} {'ns/byte':>10}")
+    for name, table_driven in [('if/elif', False), ('table', True)]:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            count = len(lex_to_list(text, table_driven))
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{name:>12} {count:>10} {best:>10.4f} {best / size * 1e9:>10.1f}")
+
+
+def allocated_bytes(build, text):
+    tracemalloc.start()
+    result = build(text)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, len(result)
+
+
+def run_memory(size):
+    text = make_document(size)
+    print(f"\nmemory for a {size} byte document")
+    print(f"{'storage':>12} {'tokens':>10} {'bytes':>12} {'bytes/token':>12}")
+    for name, build in [('Token list', lex_to_list), ('TokenStore', TokenStore)]:
+        allocated, count = allocated_bytes(build, text)
+        print(f"{name:>12} {count:>10} {allocated:>12} {allocated / count:>12.1f}")
+
+
+def run_file(size):
+    with tempfile.NamedTemporaryFile('w', suffix='.md', delete=False, encoding='utf-8') as file:
+        file.write(make_document(size))
+    print(f"\nlexing a {size} byte file")
+    print(f"{'input':>12} {'tokens':>10} {'seconds':>10} {'peak bytes':>12}")
+    try:
+        for name, build in [('read()', lambda path: TokenStore(open(path, encoding='utf-8').read())),
+                            ('mmap', TokenStore.from_file)]:
+            start = time.perf_counter()
+            store = build(file.name)
+            elapsed = time.perf_counter() - start
+            store.close()
+
+            tracemalloc.start()  # separate run, tracing slows everything down
+            build(file.name).close()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{name:>12} {len(store):>10} {elapsed:>10.4f} {peak:>12}")
+    finally:
+        os.remove(file.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for the lab3 Markdown lexer")
+    parser.add_argument('--size', type=int, default=1_000_000, help="document size used to time the lexer modes")
+    parser.add_argument('--repeat', type=int, default=3, help="timing runs per mode")
+    parser.add_argument('--memory-size', type=int, default=1_000_000,
+                        help="document size used to compare token storage memory")
+    parser.add_argument('--file-size', type=int, default=1_000_000,
+                        help="size of the file used to compare reading and memory-mapping")
+    args = parser.parse_args()
+    run_dispatch(args.size, args.repeat)
+    run_memory(args.memory_size)
+    run_file(args.file_size)
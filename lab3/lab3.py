@@ -1,3 +1,8 @@
+import mmap
+import re
+from array import array
+
+
 class TokenKind:
     TEXT = 1
     HASH = 2
@@ -13,7 +18,34 @@ class TokenKind:
     BANG = 12
 
 
+# kinds of the characters that form a token on their own, whitespaces map to None and everything else starts a TEXT
+CHAR_KINDS = {
+    ' ': None,
+    '\t': None,
+    '#': TokenKind.HASH,
+    '_': TokenKind.UNDERSCORE,
+    '*': TokenKind.STAR,
+    '\n': TokenKind.NEWLINE,
+    '-': TokenKind.DASH,
+    '[': TokenKind.STRAIGHTBRACEOPEN,
+    ']': TokenKind.STRAIGHTBRACECLOSE,
+    '(': TokenKind.PARENOPEN,
+    ')': TokenKind.PARENCLOSE,
+    '>': TokenKind.GREATERTHAN,
+    '!': TokenKind.BANG,
+}
+
+# rest of a TEXT token after its first character
+TEXT_RUN = re.compile(r"[^ \n\t#_*\-\[\]()>!`]*")
+
+# the same tables for lines given as bytes, where indexing gives ints instead of characters
+BYTE_KINDS = {ord(char): kind for char, kind in CHAR_KINDS.items()}
+BYTES_TEXT_RUN = re.compile(TEXT_RUN.pattern.encode())
+
+
 class Token:
+    __slots__ = ('kind', 'value', 'pos', 'line')
+
     def __init__(self, kind, value, pos, line):
         self.kind = kind
         self.value = value
@@ -25,22 +57,76 @@ class Token:
         return f"{token_kind_name} {' '*(19-len(token_kind_name))}  pos={self.pos} \t line={self.line} \t value='{self.value}'"
 
 
+def iter_lines(source, chunk_size=1 << 16):
+    """Lazily yields the stripped, non-empty lines of source, each one ending with a newline.
+
+    source can be a string, a file object or an iterable of string chunks.
+    """
+    for _, line in iter_offset_lines(source, chunk_size):
+        yield line
+
+
+def iter_offset_lines(source, chunk_size=1 << 16):
+    """Same as iter_lines, but yields (offset, line) pairs, offset being the position of the line's first character"""
+    if isinstance(source, str):
+        chunks = (source,)
+    elif hasattr(source, 'read'):  # file object
+        chunks = iter(lambda: source.read(chunk_size), '')
+    else:
+        chunks = source
+
+    tail = ''
+    tail_offset = 0  # position of tail[0] in the whole input
+    for chunk in chunks:
+        text = tail + chunk if tail else chunk
+        start = 0
+        end = text.find('\n')
+        while end != -1:
+            line = text[start:end]
+            stripped = line.strip()
+            if stripped:  # markdown ignores empty lines
+                yield tail_offset + start + len(line) - len(line.lstrip()), stripped + "\n"
+            start = end + 1
+            end = text.find('\n', start)
+        tail = text[start:]
+        tail_offset += start
+
+    stripped = tail.strip()
+    if stripped:
+        yield tail_offset + len(tail) - len(tail.lstrip()), stripped + "\n"
+
+
+def lex_line(line, line_number, pos=0):
+    """Yields the tokens of a single stripped line that ends with a newline, starting at pos.
+
+    line can also be bytes, then TEXT values are bytes too.
+    """
+    if isinstance(line, str):
+        char_kinds, text_run_end = CHAR_KINDS, TEXT_RUN.match
+    else:
+        char_kinds, text_run_end = BYTE_KINDS, BYTES_TEXT_RUN.match
+    while pos < len(line):
+        kind = char_kinds.get(line[pos], TokenKind.TEXT)
+        if kind is None:
+            pos += 1
+        elif kind == TokenKind.TEXT:
+            end = text_run_end(line, pos + 1).end()  # the first character is never a delimiter
+            yield Token(kind, line[pos:end], pos, line_number)
+            pos = end
+        else:
+            yield Token(kind, "", pos, line_number)
+            pos += 1
+
+
 class Lexer:
-    def __init__(self, input_string):
-        self.input_lines = []
+    def __init__(self, source):
+        self.input_lines = iter_lines(source)  # lines are read one at a time, only when the lexer gets to them
         self.line_number = 0
         self.char_pos = 0
         self.current_line = ''
         self.current_char = ''
         self.tokens = []
 
-        raw_input_lines = input_string.split('\n')
-        for line in raw_input_lines:  # markdown ignores empty lines
-            line = line.strip()
-            if line:
-                line += "\n"
-                self.input_lines.append(line)
-
         self.advance_line()  # init first line
 
     def advance(self):
@@ -49,22 +135,28 @@ class Lexer:
             self.char_pos += 1
 
     def advance_line(self):
-        if self.line_number < len(self.input_lines):
-            self.current_line = self.input_lines[self.line_number]
+        line = next(self.input_lines, None)
+        if line is not None:
+            self.current_line = line
             self.line_number += 1
             self.char_pos = 0
             self.advance()
         else:
             self.current_char = None  # the end
 
-    def add_token(self, kind, value=""):
+    def make_token(self, kind, value=""):
+        """Builds a token of kind that ends at the current position"""
         if self.current_char == '\n' and kind == TokenKind.NEWLINE:  # adjust position for \n
             adjusted_pos = len(self.current_line)-1
         else:
             adjusted_pos = self.char_pos - len(value)-1 if value else self.char_pos-1
-        self.tokens.append(Token(kind, value, adjusted_pos, self.line_number))
+        return Token(kind, value, adjusted_pos, self.line_number)
+
+    def lex(self, table_driven=False):
+        self.tokens.extend(self.iter_tokens_table() if table_driven else self.iter_tokens())
 
-    def lex(self):
+    def iter_tokens(self):
+        """Yields tokens one by one as the input is read, without collecting them in self.tokens"""
         while self.current_char is not None:
             if self.current_char in ' \t':  # markdown ignores whitespaces and tabs
                 self.advance()
@@ -101,11 +193,11 @@ class Lexer:
                 while (self.current_char is not None) and (self.current_char not in ' \n\t#_*-[]()>!`'):
                     value += self.current_char
                     self.advance()
-                self.add_token(TokenKind.TEXT, value)
+                yield self.make_token(TokenKind.TEXT, value)
                 continue
 
             if token_kind:
-                self.add_token(token_kind, value)
+                yield self.make_token(token_kind, value)
 
             if token_kind == TokenKind.NEWLINE:
                 self.advance_line()
@@ -113,11 +205,97 @@ class Lexer:
 
             self.advance()
 
+    def iter_tokens_table(self):
+        """Yields the same tokens as iter_tokens, but looks every character up in CHAR_KINDS and matches whole TEXT
+        runs with a single regex instead of going through advance() one character at a time"""
+        while self.current_char is not None:
+            yield from lex_line(self.current_line, self.line_number, self.char_pos - 1)
+            self.advance_line()
+
     def print_tokens(self):
         for token in self.tokens:
             print(token.get_string())
 
 
+class TokenStore:
+    """Compact storage for the tokens of a text.
+
+    Kinds, start/end offsets and line numbers are kept in parallel arrays, TEXT values are sliced from the text only
+    when a token is read. Indexing or iterating the store gives the same Token objects as Lexer.lex().
+
+    text can also be bytes or a memory-mapped file (see from_file), then offsets are byte positions and TEXT values
+    are decoded from UTF-8 when they're read. Lines are stripped of ASCII whitespace only in that case.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.kinds = array('B')
+        self.starts = array('q')
+        self.ends = array('q')
+        self.lines = array('I')
+        self.line_starts = array('q')  # offset of the first character of every (stripped) line
+
+        if isinstance(text, str):
+            for offset, _ in iter_offset_lines(text):
+                self.line_starts.append(offset)
+            tokens = Lexer(text).iter_tokens_table()
+        else:
+            tokens = self.__lex_bytes__()
+        for token in tokens:
+            start = self.line_starts[token.line - 1] + token.pos
+            self.kinds.append(token.kind)
+            self.starts.append(start)
+            self.ends.append(start + len(token.value))
+            self.lines.append(token.line)
+
+    @classmethod
+    def from_file(cls, path):
+        """Lexes a file directly from a read-only memory map of it, without reading it into memory first"""
+        with open(path, 'rb') as file:
+            if file.seek(0, 2) == 0:
+                return cls(b'')  # empty files can't be mapped
+            return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def close(self):
+        if isinstance(self.text, mmap.mmap):
+            self.text.close()
+
+    def __lex_bytes__(self):
+        text = self.text
+        line_number = 0
+        position = 0
+        while position < len(text):
+            end = text.find(b'\n', position)
+            if end == -1:
+                end = len(text)
+            raw_line = text[position:end]
+            line = raw_line.strip()
+            if line:  # markdown ignores empty lines
+                line_number += 1
+                self.line_starts.append(position + len(raw_line) - len(raw_line.lstrip()))
+                yield from lex_line(line + b'\n', line_number)
+            position = end + 1
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        start, line = self.starts[index], self.lines[index]
+        value = self.text[start:self.ends[index]]
+        if not isinstance(value, str):
+            value = value.decode()
+        return Token(self.kinds[index], value, start - self.line_starts[line - 1], line)
+
+    def __iter__(self):
+        for index in range(len(self.kinds)):
+            yield self[index]
+
+    def memory_size(self):
+        """Bytes used by the token columns, the text itself is not counted"""
+        columns = (self.kinds, self.starts, self.ends, self.lines, self.line_starts)
+        return sum(column.itemsize * len(column) for column in columns)
+
+
 markdown_input = """
 # Heading 1
 ## Heading 2
@@ -131,6 +309,7 @@ justtext
 > Quote"""
 
 
-lexer = Lexer(markdown_input)
-lexer.lex()
-lexer.print_tokens()
+if __name__ == "__main__":
+    lexer = Lexer(markdown_input)
+    lexer.lex()
+    lexer.print_tokens()